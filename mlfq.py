@@ -20,6 +20,22 @@
 # SJF: Shortest Job First
 # CS: Context Switch
 
+import argparse
+import contextlib
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import pickle
+import re
+import shutil
+import struct
+import sys
+from array import array
+from collections import deque
+from time import perf_counter
+
 # We start first by initializing the constants.
 
 RR_TIME_QUANTUM = 4
@@ -30,20 +46,195 @@ SJF_LOW_PRIORITY = 3
 
 NULL_QUEUE_PRIORITY = 0  # This is for processes that have completely finished.
 
+# Bump this whenever a change alters the outcome of a run, so that cached results (see ResultCache) are no longer used.
+SCHEDULER_VERSION = 1
+
+# Trace levels decide how much the scheduler reports while it runs (see TraceSink).
+
+TRACE_OFF = 0
+TRACE_SUMMARY = 1  # Only the turn-around and waiting times at the end.
+TRACE_EVENTS = 2  # Every state change (arrival, dispatch, demotion, I/O, ...) as it happens, plus the summary.
+TRACE_FULL = 3  # The state of the MLFQ every ms, plus the summary. Only the tick engine can produce this.
+
+TRACE_LEVELS = {"off": TRACE_OFF, "summary": TRACE_SUMMARY, "events": TRACE_EVENTS, "full": TRACE_FULL}
+
+TRACE_EVENT_KINDS = ["arrive", "dispatch", "quantum_expired", "demote", "io_start", "io_finish", "context_switch", "done"]
+TRACE_EVENT_TEXT = {
+    "arrive": "ARRIVED",
+    "dispatch": "RUNNING",
+    "quantum_expired": "QUANTUM EXPIRED",
+    "demote": "DEMOTED",
+    "io_start": "STARTED I/O",
+    "io_finish": "FINISHED I/O",
+    "context_switch": "SWITCHING IN",
+    "done": "DONE",
+}
+
+
+class ShortestJobFirstQueue:
+    # The SJF level is kept as a binary heap keyed by (remaining CPU time, processID), so picking
+    # the shortest job costs O(log n) instead of re-sorting the whole level every ms. The key of a
+    # process is cached in Process.remainingCpuTime and only shrinks while that process runs, and
+    # the running process is always the top of the heap, so its entry can be updated in place.
+
+    def __init__(self):
+        self.heap = []
+        # Iterating over the queue lists the processes in the order the old list-based queue had:
+        # sorted when the level was last ordered, followed by the ones queued (or rotated to the back) since.
+        self.orderedByRemainingTime = False
+        self.recentlyQueued = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __iter__(self):
+        if self.orderedByRemainingTime:
+            key = lambda p: (p.remainingCpuTime, p.processID)
+        else:
+            key = lambda p: (p.remainingBurst, p.processID)
+        settled = sorted((entry[2] for entry in self.heap if entry[2] not in self.recentlyQueued), key=key)
+        return iter(settled + self.recentlyQueued)
+
+    def push(self, process):
+        heapq.heappush(self.heap, (process.remainingCpuTime, process.processID, process))
+        self.recentlyQueued.append(process)
+
+    def peek(self):
+        return self.heap[0][2]
+
+    def pop(self):
+        process = heapq.heappop(self.heap)[2]
+        if process in self.recentlyQueued:
+            self.recentlyQueued.remove(process)
+        return process
+
+    def runner_up(self):
+        # The second shortest job is always one of the two children of the top of the heap.
+        return min(self.heap[1:3])[2]
+
+    def update_top(self):
+        # Only valid after the key of the top process went down.
+        process = self.heap[0][2]
+        self.heap[0] = (process.remainingCpuTime, process.processID, process)
+
+    def rotate_top(self):
+        # The old list-based queue moved the process that just ran to the back.
+        # The heap does not need to, but the printed order does.
+        self.recentlyQueued.append(self.heap[0][2])
+
+    def reorder(self, by_remaining_time=False):
+        self.orderedByRemainingTime = by_remaining_time
+        self.recentlyQueued = []
+
+
+class IOTracker:
+    # Processes doing I/O. Instead of counting every I/O burst down each ms, the tracker keeps its own
+    # I/O clock (one tick per ms of I/O progress) and a min-heap of the clock ticks on which each burst
+    # finishes, so only the processes that are due get woken up. Processes finishing on the same tick
+    # come out in the order they started their I/O, which is the order of the I/O list printed below.
+
+    def __init__(self):
+        self.clock = 0
+        self.heap = []
+        self.processes = {}  # processID -> process, in the order they started I/O
+        self.sequence = 0
+
+    def __len__(self):
+        return len(self.processes)
+
+    def __iter__(self):
+        return iter(self.processes.values())
+
+    def append(self, process):
+        heapq.heappush(self.heap, (self.clock + process.remainingBurst, self.sequence, process))
+        self.processes[process.processID] = process
+        self.sequence += 1
+
+    def steps_until_next_finish(self):
+        # None if no process is doing I/O.
+        return self.heap[0][0] - self.clock if self.heap else None
+
+    def advance(self, steps=1):
+        # Moves the I/O clock forward and returns (steps taken when it finished, process) for every
+        # process whose I/O burst finished on the way, in finishing order.
+        start = self.clock
+        self.clock += steps
+        finished = []
+        while self.heap and self.heap[0][0] <= self.clock:
+            finish_tick, _, process = heapq.heappop(self.heap)
+            del self.processes[process.processID]
+            finished.append((finish_tick - start, process))
+        return finished
+
+
+class ArrivalStream:
+    # Hands the processes to the scheduler in arrival order, either from a list (see parse_input())
+    # or lazily from an iterator (see read_input()). Processes taken from an iterator are only kept
+    # when `retain` is set, for the final summary.
+
+    def __init__(self, processes, retain=False):
+        self.processes = iter(processes)
+        self.nextProcess = next(self.processes, None)
+        self.retain = retain
+        self.retained = []
+
+    def peek(self):
+        # None once every process has arrived.
+        return self.nextProcess
+
+    def pop(self):
+        process = self.nextProcess
+        self.nextProcess = next(self.processes, None)
+        if self.retain:
+            self.retained.append(process)
+        return process
+
+    def drain(self):
+        # Takes the processes that never got to arrive as well, and returns every process retained.
+        while self.nextProcess is not None:
+            self.pop()
+        return self.retained
+
+    def __getstate__(self):
+        # A checkpoint cannot hold an open file, so the processes that are still to be read are read now.
+        self.processes = iter(list(self.processes))
+        return self.__dict__
+
 
 class MLFQ:
-    def __init__(self, rr_allotment, fcfs_allotment, context_switch_time):
+    def __init__(self, rr_allotment, fcfs_allotment, context_switch_time, rr_time_quantum=RR_TIME_QUANTUM):
         self.currentGlobalTime = 0
         self.recentRunningProcess = 0
-        self.roundRobinQueue = []
-        self.rrTimeQuantum = RR_TIME_QUANTUM
+        self.currentRunningProcess = None  # Track the currently running process
+        self.roundRobinQueue = deque()
+        self.rrTimeQuantum = rr_time_quantum
         self.rrTimeAllotment = rr_allotment
-        self.firstComeFirstServeQueue = []
+        self.firstComeFirstServeQueue = deque()
         self.fcfsTimeAllotment = fcfs_allotment
-        self.shortestJobFirstQueue = []
-        self.ioProcesses = []
+        self.shortestJobFirstQueue = ShortestJobFirstQueue()
+        self.ioProcesses = IOTracker()
         self.contextSwitch = context_switch_time
         self.totalCSTime = 0
+        self.totalCPUTime = 0  # ms in which a process ran on the CPU.
+        self.arrivals = ArrivalStream([])
+        self.processList = None  # Every process of the run, unless they are read lazily (see _attach_processes()).
+        self.finished = False
+        self.undisplayedDoneProcesses = []
+        self.recentlyDemotedProcesses = []
+        self.lastDispatchedProcess = None  # The process that was given the CPU most recently.
+        self.dispatchCount = 0  # Number of times the CPU was given to a different process.
+        self.trace = TraceSink(TRACE_OFF)
+        self.traceEvents = False
+        self.traceStates = False
+        self.summaryStats = None  # SummaryStatistics of the processes completed so far, if set.
+        self.metrics = None  # Set to a Metrics (and profile to a PhaseTimer) before a run to instrument it.
+        self.profile = None
+
+    def __getstate__(self):
+        # Trace sinks hold open files, so checkpoints leave the trace out; a resumed run is given its own.
+        state = self.__dict__.copy()
+        state.update(trace=TraceSink(TRACE_OFF), traceEvents=False, traceStates=False)
+        return state
 
 
 # Each process has its own set of properties that identifies them.
@@ -51,13 +242,30 @@ class MLFQ:
 # details in advance through the set1.txt and set2.txt input files.
 
 
+# A workload can hold millions of processes, so a process is a slotted object and its bursts are not
+# kept in Python lists. `bursts` is a flat, read-only sequence of alternating CPU and I/O burst lengths
+# (cpu, io, cpu, ...), normally shared by all the processes of a workload, and a process only keeps the
+# range of its own bursts in it, the burst it is in, and how much of that burst is left.
+# That is about 370 bytes per parsed process, most of it the object itself and its name; compiled
+# workloads read with --stream (see CompiledWorkload) only create processes as they arrive.
+
+
 class Process:
+    __slots__ = ("processName", "processID", "arrivalTime", "bursts", "burstStart", "burstIndex", "burstEnd",
+                 "remainingBurst", "remainingCpuTime", "usedTimeQuantum", "usedTimeAllotment", "totalBurstTime",
+                 "completionTime", "turnaroundTime", "waitingTime", "processCSTime", "displayedDone", "currentQueue",
+                 "recentDemotionTime", "firstRunTime")
+
     def __init__(self):
         self.processName = ""
         self.processID = 0
         self.arrivalTime = 0
-        self.cpuTimes = []
-        self.ioTimes = []
+        self.bursts = ()
+        self.burstStart = 0
+        self.burstIndex = 0  # CPU bursts are an even number of places after burstStart, I/O bursts an odd number.
+        self.burstEnd = 0
+        self.remainingBurst = 0  # ms left in the current burst (I/O bursts are counted down by IOTracker instead).
+        self.remainingCpuTime = 0  # ms left in all of the CPU bursts; used as the SJF key.
         self.usedTimeQuantum = 0
         self.usedTimeAllotment = 0
         self.totalBurstTime = 0
@@ -68,6 +276,75 @@ class Process:
         self.displayedDone = False
         self.currentQueue = RR_HIGH_PRIORITY  # All processes start at the Highest Queue: Round Robin.
         self.recentDemotionTime = -1 # Added to track timestamp of demotion
+        self.firstRunTime = -1  # Time of the first dispatch; response time = firstRunTime - arrivalTime.
+
+    def set_bursts(self, bursts, start: int = 0, end: int = None):
+        self.bursts = bursts
+        self.burstStart = self.burstIndex = start
+        self.burstEnd = len(bursts) if end is None else end
+        self.remainingBurst = bursts[start]
+        self.remainingCpuTime = sum(bursts[start:self.burstEnd:2])
+        self.totalBurstTime = sum(bursts[start:self.burstEnd])
+
+    def next_burst(self):
+        # Moves on to the next burst. Returns False if the process has no bursts left.
+        self.burstIndex += 1
+        if self.burstIndex == self.burstEnd:
+            return False
+        self.remainingBurst = self.bursts[self.burstIndex]
+        return True
+
+    def __getstate__(self):
+        # Bursts mapped from a compiled workload (see CompiledWorkload) cannot be pickled into a checkpoint,
+        # so the process takes a copy of its own bursts there.
+        state = {slot: getattr(self, slot) for slot in self.__slots__}
+        if isinstance(self.bursts, memoryview):
+            state.update(bursts=array("q", self.bursts[self.burstStart:self.burstEnd]), burstStart=0,
+                         burstIndex=self.burstIndex - self.burstStart, burstEnd=self.burstEnd - self.burstStart)
+        return None, state
+
+    # The CPU and I/O bursts that are left, the current one first. These lists are built on request,
+    # for inspecting a process; the scheduler itself only uses the fields above.
+
+    @property
+    def cpuTimes(self):
+        if (self.burstIndex - self.burstStart) % 2 == 0:
+            return [self.remainingBurst] + list(self.bursts[self.burstIndex + 2:self.burstEnd:2])
+        return list(self.bursts[self.burstIndex + 1:self.burstEnd:2])
+
+    @property
+    def ioTimes(self):
+        if (self.burstIndex - self.burstStart) % 2 == 0:
+            return list(self.bursts[self.burstIndex + 1:self.burstEnd:2])
+        return list(self.bursts[self.burstIndex:self.burstEnd:2])
+
+def parse_process_line(process_line: str, process_id: int, line_number: int, burst_store: array = None):
+    # The bursts are appended to burst_store if one is given, or else stored in an array of their own.
+    # In addition, we also know that these details have a fixed pattern and are always separated by semicolons.
+    parts = process_line.strip().split(";")
+    if len(parts) < 3 or not parts[0]:
+        raise ValueError(f"Line {line_number}: expected 'name;arrival;cpu[;io;cpu...]', got {process_line.strip()!r}")
+
+    try:
+        arrival_time = int(parts[1])
+        bursts = [int(part) for part in parts[2:]]
+    except ValueError:
+        raise ValueError(f"Line {line_number}: arrival time and bursts must be integers, got {process_line.strip()!r}") from None
+    if arrival_time < 0 or min(bursts) <= 0:
+        raise ValueError(f"Line {line_number}: the arrival time cannot be negative and bursts must be at least 1 ms")
+
+    process = Process()
+    process.processName = parts[0]
+    process.processID = process_id
+    process.arrivalTime = arrival_time
+    if burst_store is None:
+        process.set_bursts(array("q", bursts))
+    else:
+        start = len(burst_store)
+        burst_store.extend(bursts)
+        process.set_bursts(burst_store, start, len(burst_store))
+    return process
+
 
 def parse_input(file_content: str):
     lines = file_content.strip().split("\n")
@@ -84,25 +361,10 @@ def parse_input(file_content: str):
     process_lines = lines[5:]
 
     process_list = []
+    burst_store = array("q")  # The bursts of every process, one after the other.
 
-    # In addition, we also know that these details have a fixed pattern and are always separated by semicolons.
     for idx, process_line in enumerate(process_lines):
-        parts = process_line.split(";")
-        process_name = parts[0]
-        arrival_time = int(parts[1])
-
-        cpu_times = [int(parts[i]) for i in range(2, len(parts), 2)]
-        io_times = [int(parts[i]) for i in range(3, len(parts), 2)]
-
-        process = Process()
-        process.processName = process_name
-        process.processID = idx + 1
-        process.arrivalTime = arrival_time
-        process.cpuTimes = cpu_times
-        process.ioTimes = io_times
-        process.totalBurstTime = sum(cpu_times) + sum(io_times)
-
-        process_list.append(process)
+        process_list.append(parse_process_line(process_line, idx + 1, idx + 6, burst_store))
 
     # Sort processes by arrival time and then by process ID (alphabetical order).
     # We assume that the input file is already sorted at least by processName.
@@ -112,16 +374,188 @@ def parse_input(file_content: str):
     return num_processes, rr_allotment, fcfs_allotment, context_switch_time, process_list
 
 
+# parse_input() needs the whole file in memory and builds every process before the simulation starts.
+# read_input() reads the same format from an open file, but hands the processes out one at a time as
+# the scheduler asks for them, so it requires the processes to be listed in arrival order.
+
+
+def read_input(file):
+    try:
+        num_processes, rr_allotment, fcfs_allotment, context_switch_time = [int(file.readline()) for _ in range(4)]
+    except ValueError:
+        raise ValueError("The first four lines must be the number of processes, the RR and FCFS time allotments and the context switch time.") from None
+
+    return num_processes, rr_allotment, fcfs_allotment, context_switch_time, _read_processes(file, num_processes)
+
+
+def _read_processes(file, num_processes: int):
+    count = 0
+    previous_arrival_time = 0
+    for line_number, process_line in enumerate(file, start=5):
+        if not process_line.strip():
+            continue
+
+        count += 1
+        process = parse_process_line(process_line, count, line_number)
+        if process.arrivalTime < previous_arrival_time:
+            raise ValueError(f"Line {line_number}: process {process.processName} arrives at {process.arrivalTime}, before the process above it "
+                             f"(at {previous_arrival_time}); processes have to be listed in arrival order to be read as a stream")
+        previous_arrival_time = process.arrivalTime
+        yield process
+
+    if count != num_processes:
+        raise ValueError(f"Expected {num_processes} processes, but the input lists {count}")
+
+
+# Compiled workloads hold the same processes as a workload file, in a binary layout that is memory-mapped
+# instead of parsed, so that a large archived workload is only parsed once (by compile_workload()). The
+# file (little-endian) starts with COMPILED_WORKLOAD_MAGIC and a header of 64-bit integers: the number of
+# processes and the RR and FCFS time allotments and context switch time from the workload file, then the
+# number of process records and of bursts. Next come the process records, in the order parse_input()
+# returns the processes, each made of 8 64-bit integers: arrival time, processID, the range of the
+# process's bursts in the burst array, the range of its name in the names, and its total CPU and burst
+# times (see Process.set_bursts()), which would otherwise have to be summed up. Then comes the burst array
+# (the bursts of every process as 64-bit integers, in file order), and the UTF-8 names fill the rest.
+#
+# The processes read from a compiled workload use the mapped burst array as their `bursts`, without copying it.
+
+COMPILED_WORKLOAD_MAGIC = b"MLFQWKL1"
+
+_COMPILED_HEADER = struct.Struct("<6q")
+_COMPILED_RECORD_FIELDS = 8
+
+
+def compile_workload(input_file: str, output_file: str):
+    # Reads the workload file a line at a time, so only the compiled columns are held in memory.
+    with open(input_file, "r") as file:
+        try:
+            header = [int(file.readline()) for _ in range(4)]
+        except ValueError:
+            raise ValueError("The first four lines must be the number of processes, the RR and FCFS time allotments and the context switch time.") from None
+
+        arrival_times, burst_offsets, bursts = array("q"), array("q", [0]), array("q")
+        names, name_offsets = bytearray(), array("q", [0])
+        cpu_times, total_times = array("q"), array("q")
+        for line_number, process_line in enumerate(file, start=5):
+            if not process_line.strip():
+                continue
+            process = parse_process_line(process_line, len(arrival_times) + 1, line_number, bursts)
+            arrival_times.append(process.arrivalTime)
+            burst_offsets.append(len(bursts))
+            names += process.processName.encode()
+            name_offsets.append(len(names))
+            cpu_times.append(process.remainingCpuTime)
+            total_times.append(process.totalBurstTime)
+
+    # Sorted by arrival time and then by processID, as parse_input() sorts them.
+    order = range(len(arrival_times))
+    if any(arrival_times[idx] > arrival_times[idx + 1] for idx in range(len(arrival_times) - 1)):
+        order = sorted(order, key=arrival_times.__getitem__)
+    records = array("q")
+    for idx in order:
+        records.extend((arrival_times[idx], idx + 1, burst_offsets[idx], burst_offsets[idx + 1], name_offsets[idx], name_offsets[idx + 1],
+                        cpu_times[idx], total_times[idx]))
+    if sys.byteorder == "big":
+        records.byteswap()
+        bursts.byteswap()
+
+    with open(output_file, "wb") as file:
+        file.write(COMPILED_WORKLOAD_MAGIC)
+        file.write(_COMPILED_HEADER.pack(*header, len(arrival_times), len(bursts)))
+        records.tofile(file)
+        bursts.tofile(file)
+        file.write(names)
+
+
+def is_compiled_workload(path: str):
+    with open(path, "rb") as file:
+        return file.read(len(COMPILED_WORKLOAD_MAGIC)) == COMPILED_WORKLOAD_MAGIC
+
+
+class CompiledWorkload:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            if file.read(len(COMPILED_WORKLOAD_MAGIC)) != COMPILED_WORKLOAD_MAGIC:
+                raise ValueError(f"{path} is not a compiled MLFQ workload")
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        offset = len(COMPILED_WORKLOAD_MAGIC)
+        (self.numProcesses, self.rrTimeAllotment, self.fcfsTimeAllotment, self.contextSwitch,
+         self.processCount, burst_count) = _COMPILED_HEADER.unpack_from(self.buffer, offset)
+        records_start = offset + _COMPILED_HEADER.size
+        bursts_start = records_start + 8 * _COMPILED_RECORD_FIELDS * self.processCount
+        names_start = bursts_start + 8 * burst_count
+        if names_start > len(self.buffer):
+            raise ValueError(f"{path} is truncated")
+
+        view = memoryview(self.buffer)
+        self.records = view[records_start:bursts_start].cast("q")
+        self.bursts = view[bursts_start:names_start].cast("q")
+        self.names = view[names_start:]
+        if sys.byteorder == "big":
+            # The mapped integers are little-endian, so big-endian machines work on a swapped copy instead.
+            self.records, self.bursts = array("q", self.records), array("q", self.bursts)
+            self.records.byteswap()
+            self.bursts.byteswap()
+
+    def __reduce__(self):
+        # Worker processes map the file again rather than receive a copy of it.
+        return CompiledWorkload, (self.path,)
+
+    def processes(self):
+        # Yields new Process objects, in arrival order, every time it is called.
+        bursts = self.bursts
+        fields = iter(self.records)
+        for (arrival_time, process_id, burst_start, burst_end, name_start, name_end,
+             cpu_time, total_time) in zip(*[fields] * _COMPILED_RECORD_FIELDS):
+            # As set_bursts() would do, with the sums taken from the record.
+            process = Process()
+            process.processName = str(self.names[name_start:name_end], "utf-8")
+            process.processID = process_id
+            process.arrivalTime = arrival_time
+            process.bursts = bursts
+            process.burstStart = process.burstIndex = burst_start
+            process.burstEnd = burst_end
+            process.remainingBurst = bursts[burst_start]
+            process.remainingCpuTime = cpu_time
+            process.totalBurstTime = total_time
+            yield process
+
+    def parse(self, lazy: bool = False):
+        # The same as parse_input() gives for the workload file, or with lazy=True, as read_input() does.
+        processes = self.processes()
+        return (self.numProcesses, self.rrTimeAllotment, self.fcfsTimeAllotment, self.contextSwitch,
+                processes if lazy else list(processes))
+
+    def digest(self):
+        # Identifies the compiled workload in result cache keys (see result_cache_key()).
+        return hashlib.sha256(self.buffer).hexdigest()
+
+
+
+# Finished and demoted processes are listed in process_list order, i.e. by arrival time and then by process ID.
+
+
+def _take_undisplayed_done_processes(MLFQ: MLFQ):
+    done_processes = sorted(MLFQ.undisplayedDoneProcesses, key=lambda p: (p.arrivalTime, p.processID))
+    for p in done_processes:
+        p.displayedDone = False
+    MLFQ.undisplayedDoneProcesses = []
+    return done_processes
+
+
+def _demoted_processes(MLFQ: MLFQ):
+    # Condition to check if current time == demotion time (to address repeating printed demotion output)
+    return [p for p in sorted(MLFQ.recentlyDemotedProcesses, key=lambda p: (p.arrivalTime, p.processID)) if p.recentDemotionTime == MLFQ.currentGlobalTime]
+
 
 def print_mlfq_state(MLFQ: MLFQ, process_list: list[Process], current_process: Process = None):
     print(f"At Time = {MLFQ.currentGlobalTime}")
     
-    done_processes = [p.processName for p in process_list if (p.currentQueue == NULL_QUEUE_PRIORITY) and p.displayedDone == True]
+    done_processes = [p.processName for p in _take_undisplayed_done_processes(MLFQ)]
     if done_processes:
         print(f"{', '.join(done_processes)} DONE")
-        for p in process_list:
-            if p.processName in done_processes:
-                p.displayedDone = False
 
     arriving_processes = [p.processName for p in MLFQ.roundRobinQueue if p.arrivalTime == MLFQ.currentGlobalTime]
     if arriving_processes:
@@ -129,7 +563,8 @@ def print_mlfq_state(MLFQ: MLFQ, process_list: list[Process], current_process: P
 
     round_robin_queue = [p.processName for p in MLFQ.roundRobinQueue]
     fcfs_queue = [p.processName for p in MLFQ.firstComeFirstServeQueue]
-    sjf_queue = [p.processName for p in MLFQ.shortestJobFirstQueue]
+    sjf_order = list(MLFQ.shortestJobFirstQueue)
+    sjf_queue = [p.processName for p in sjf_order]
 
     # print(f"Queues: [{', '.join(round_robin_queue)}]; [{', '.join(fcfs_queue)}]; [{', '.join(sjf_queue)}]")
     if MLFQ.contextSwitch > 0:
@@ -145,7 +580,7 @@ def print_mlfq_state(MLFQ: MLFQ, process_list: list[Process], current_process: P
                 fcfs_queue = [p.processName for p in MLFQ.firstComeFirstServeQueue][1:]
                 print(f"Queues: [{', '.join(round_robin_queue)}]; [{', '.join(fcfs_queue)}]; [{', '.join(sjf_queue)}]")
             elif MLFQ.shortestJobFirstQueue:
-                sjf_queue = [p.processName for p in MLFQ.shortestJobFirstQueue][1:]
+                sjf_queue = [p.processName for p in sjf_order][1:]
                 print(f"Queues: [{', '.join(round_robin_queue)}]; [{', '.join(fcfs_queue)}]; [{', '.join(sjf_queue)}]")
 
             if not MLFQ.roundRobinQueue and not MLFQ.firstComeFirstServeQueue and not MLFQ.shortestJobFirstQueue:
@@ -155,7 +590,7 @@ def print_mlfq_state(MLFQ: MLFQ, process_list: list[Process], current_process: P
             elif MLFQ.firstComeFirstServeQueue:
                 print(f"CPU: {MLFQ.firstComeFirstServeQueue[0].processName}")
             elif MLFQ.shortestJobFirstQueue:
-                print(f"CPU: {MLFQ.shortestJobFirstQueue[0].processName}")
+                print(f"CPU: {sjf_order[0].processName}")
             else:
                 print("CPU: []")
         else:
@@ -169,8 +604,8 @@ def print_mlfq_state(MLFQ: MLFQ, process_list: list[Process], current_process: P
             fcfs_queue = [p.processName for p in MLFQ.firstComeFirstServeQueue][1:]
             print(f"Queues: [{', '.join(round_robin_queue)}]; [{', '.join(fcfs_queue)}]; [{', '.join(sjf_queue)}]")
         elif MLFQ.shortestJobFirstQueue:
-            MLFQ.shortestJobFirstQueue.sort(key=lambda p: (p.cpuTimes[0], p.processID))
-            sjf_queue = [p.processName for p in MLFQ.shortestJobFirstQueue][1:]
+            sjf_order.sort(key=lambda p: (p.remainingBurst, p.processID))
+            sjf_queue = [p.processName for p in sjf_order][1:]
             print(f"Queues: [{', '.join(round_robin_queue)}]; [{', '.join(fcfs_queue)}]; [{', '.join(sjf_queue)}]")
         else:
             print(f"Queues: [{', '.join(round_robin_queue)}]; [{', '.join(fcfs_queue)}]; [{', '.join(sjf_queue)}]")
@@ -182,7 +617,7 @@ def print_mlfq_state(MLFQ: MLFQ, process_list: list[Process], current_process: P
         elif MLFQ.firstComeFirstServeQueue:
             print(f"CPU: {MLFQ.firstComeFirstServeQueue[0].processName}")
         elif MLFQ.shortestJobFirstQueue:
-            print(f"CPU: {MLFQ.shortestJobFirstQueue[0].processName}")
+            print(f"CPU: {sjf_order[0].processName}")
         else:
             print("CPU: []")
 
@@ -191,7 +626,7 @@ def print_mlfq_state(MLFQ: MLFQ, process_list: list[Process], current_process: P
         io_processes = [p.processName for p in MLFQ.ioProcesses]
         print(f"I/O: [{', '.join(io_processes)}]")
 
-    demoted_processes = [p.processName for p in process_list if p.currentQueue in [FCFS_MEDIUM_PRIORITY, SJF_LOW_PRIORITY] and p.recentDemotionTime == MLFQ.currentGlobalTime] # Condition to check if current time == demotion time (to address repeating printed demotion output)
+    demoted_processes = [p.processName for p in _demoted_processes(MLFQ)]
     if demoted_processes:
         print(f"{', '.join(demoted_processes)} DEMOTED")
 
@@ -199,6 +634,112 @@ def print_mlfq_state(MLFQ: MLFQ, process_list: list[Process], current_process: P
     
     
     
+def _compute_turnaround_and_waiting(process: Process):
+    process.turnaroundTime = process.completionTime - process.arrivalTime
+    process.waitingTime = process.completionTime - process.totalBurstTime - process.processCSTime
+
+
+def summarize_simulation(MLFQ: MLFQ, process_list: list[Process]):
+    # The figures of a finished run in one dictionary, for tools that compare many runs
+    # and do not need the per-process report.
+    for process in process_list:
+        _compute_turnaround_and_waiting(process)
+
+    return {
+        "processes": len(process_list),
+        "average_turnaround": sum(p.turnaroundTime for p in process_list) / len(process_list),
+        "average_waiting": sum(p.waitingTime for p in process_list) / len(process_list),
+        "makespan": max(p.completionTime for p in process_list),
+        "total_context_switch_time": MLFQ.totalCSTime,
+    }
+
+
+# Summary statistics that are kept up to date as processes complete, instead of being computed from the
+# whole process list at the end: the count, mean, minimum and maximum of the turn-around, waiting and
+# response times, and estimates of their 50th, 95th and 99th percentiles, for all of the processes and
+# for the processes that completed in each level. Values are counted in a histogram whose buckets are
+# exact below 2 ** HISTOGRAM_EXACT_BITS and then split every power of two into 2 ** (HISTOGRAM_EXACT_BITS - 1)
+# buckets, so a percentile is off by less than 1/64 of its value and memory does not grow with the number
+# of processes.
+
+HISTOGRAM_EXACT_BITS = 7
+SUMMARY_PERCENTILES = [50, 95, 99]
+SUMMARY_METRICS = ["turnaround", "waiting", "response"]
+SUMMARY_LEVELS = {RR_HIGH_PRIORITY: "rr", FCFS_MEDIUM_PRIORITY: "fcfs", SJF_LOW_PRIORITY: "sjf"}
+
+
+class StreamingStatistic:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self.histogram = {}  # Lowest value of a bucket -> number of values in it
+
+    def add(self, value: int):
+        if self.count == 0:
+            self.minimum = self.maximum = value
+        elif value < self.minimum:
+            self.minimum = value
+        elif value > self.maximum:
+            self.maximum = value
+        self.count += 1
+        self.total += value
+
+        shift = value.bit_length() - HISTOGRAM_EXACT_BITS
+        if shift > 0:
+            value = value >> shift << shift
+        self.histogram[value] = self.histogram.get(value, 0) + 1
+
+    def percentile(self, percentile: float):
+        # The middle of the bucket holding the value of that rank (nearest-rank), within the minimum and maximum.
+        rank = max(1, -(-self.count * percentile // 100))
+        seen = 0
+        for value in sorted(self.histogram):
+            seen += self.histogram[value]
+            if seen >= rank:
+                width = 1 << max(0, value.bit_length() - HISTOGRAM_EXACT_BITS)
+                return min(max(value + (width - 1) / 2, self.minimum), self.maximum)
+        return None
+
+    def report(self):
+        report = {"count": self.count, "mean": self.total / self.count if self.count else None, "min": self.minimum, "max": self.maximum}
+        for percentile in SUMMARY_PERCENTILES:
+            report[f"p{percentile}"] = self.percentile(percentile)
+        return report
+
+
+class SummaryStatistics:
+    def __init__(self):
+        self.groups = {group: {metric: StreamingStatistic() for metric in SUMMARY_METRICS}
+                       for group in ["all"] + list(SUMMARY_LEVELS.values())}
+
+    def add(self, process: Process, level: int):
+        # `level` is the queue the process completed in; its turn-around and waiting times must be set.
+        response_time = process.firstRunTime - process.arrivalTime
+        for group in (self.groups["all"], self.groups[SUMMARY_LEVELS[level]]):
+            group["turnaround"].add(process.turnaroundTime)
+            group["waiting"].add(process.waitingTime)
+            group["response"].add(response_time)
+
+    def report(self):
+        # Levels in which no process completed are left out.
+        return {group: {metric: statistic.report() for metric, statistic in metrics.items()}
+                for group, metrics in self.groups.items() if metrics["turnaround"].count}
+
+
+def print_summary_statistics(statistics: SummaryStatistics):
+    report = statistics.report()
+    print("SIMULATION DONE\n")
+    print(f"{'Metric':<12}{'Level':<7}{'Count':>8}{'Mean':>12}{'Min':>8}{'Max':>8}" + "".join(f"{f'p{p}':>10}" for p in SUMMARY_PERCENTILES))
+    for metric in SUMMARY_METRICS:
+        for group, metrics in report.items():
+            figures = metrics[metric]
+            print(f"{metric:<12}{group:<7}{figures['count']:>8}{round(figures['mean'], 4):>12}{figures['min']:>8}{figures['max']:>8}"
+                  + "".join(f"{round(figures[f'p{p}'], 2):>10}" for p in SUMMARY_PERCENTILES))
+    print()
+
+
 def print_simulation_summary(process_list: list[Process]):
     total_turnaround_time = 0
     process_list.sort(key=lambda p: (p.processName))
@@ -207,9 +748,7 @@ def print_simulation_summary(process_list: list[Process]):
 
     # Calculate turnaround and waiting times for each process.
     for process in process_list:
-        process.turnaroundTime = process.completionTime - process.arrivalTime
-
-        process.waitingTime = process.completionTime - process.totalBurstTime - process.processCSTime
+        _compute_turnaround_and_waiting(process)
         total_turnaround_time += process.turnaroundTime
 
         print(f"Turn-around time for Process {process.processName} : " f"{process.completionTime} - {process.arrivalTime} = {process.turnaroundTime} ms")
@@ -227,203 +766,1173 @@ def print_simulation_summary(process_list: list[Process]):
     print()
 
 
-def run_mlfq_scheduler(MLFQ: MLFQ, process_list: list[Process]):
-    current_running_process = None  # Track the currently running process
+# The scheduler reports what it does through a trace sink. TextTraceSink is the human-readable
+# output above; JsonlTraceSink and BinaryTraceSink write compact records to a buffered file, which
+# is much cheaper than formatting and printing the whole MLFQ every ms on long runs.
 
-    while True:
-        # Step 1: Add newly arriving processes to the highest priority queue: the Round Robin Queue.
+
+class TraceSink:
+    # Base sink: reports nothing, but still fills in the turn-around and waiting times at the end.
+    def __init__(self, level=TRACE_SUMMARY):
+        self.level = level
+        self.aggregate = False  # Report summary_statistics() instead of every process.
+
+    def begin_run(self, MLFQ: MLFQ, label: str):
+        pass
+
+    def state(self, MLFQ: MLFQ, process_list: list[Process]):
+        pass
+
+    def event(self, time: int, kind: str, process: Process):
+        pass
+
+    def summary(self, process_list: list[Process]):
         for process in process_list:
-            if process.arrivalTime == MLFQ.currentGlobalTime and process not in MLFQ.roundRobinQueue:
-                MLFQ.roundRobinQueue.append(process)
-
-        if MLFQ.currentGlobalTime > 0:
-            # Step 2: Handle IO processes, if any. Decrement I/O bursts per time step and check for CPU burst times.
-            for process in MLFQ.ioProcesses:
-                if process.ioTimes:
-                    process.ioTimes[0] -= 1
-
-            for process in MLFQ.ioProcesses:
-                if process.ioTimes:
-                    if process.ioTimes[0] == 0:
-                        process.ioTimes.pop(0)
-                        MLFQ.ioProcesses.remove(process)
-                    
-                        if process.cpuTimes:
-                            if process.currentQueue == RR_HIGH_PRIORITY:
-                                MLFQ.roundRobinQueue.append(process)
-                            elif process.currentQueue == FCFS_MEDIUM_PRIORITY:
-                                MLFQ.firstComeFirstServeQueue.append(process)
-                            elif process.currentQueue == SJF_LOW_PRIORITY:
-                                MLFQ.shortestJobFirstQueue.append(process)
-                        
-                        else:
-                            process.currentQueue = NULL_QUEUE_PRIORITY
-                            process.displayedDone = True
-
-                        process.completionTime = MLFQ.currentGlobalTime
-                        process.processCSTime = MLFQ.totalCSTime
-            MLFQ.shortestJobFirstQueue.sort(key=lambda p: (p.cpuTimes[0], p.processID))
-            # Step 3: Process CPU bursts and handle queue transitions.
-            for current_queue in [MLFQ.roundRobinQueue, MLFQ.firstComeFirstServeQueue, MLFQ.shortestJobFirstQueue]:
-                if current_queue:
-                    if current_queue == MLFQ.shortestJobFirstQueue:
-                        # Sort the SJF queue based on remaining CPU burst time
-                        current_queue.sort(key=lambda p: (sum(p.cpuTimes), p.processID))
+            _compute_turnaround_and_waiting(process)
 
-                    current_process = current_queue[0]
+    def summary_statistics(self, statistics: SummaryStatistics):
+        pass
 
-                    # Check if a higher priority process is ready to run
-                    if current_running_process and current_running_process.currentQueue > current_process.currentQueue:
-                        # If a higher priority process is ready, do not switch if a lower priority process is running
-                        break
-
-                    # Decrement CPU bursts per time step. In addition,
-                    # increment the time quantum and time allotment used by the current process so far.
-             
-                    if current_process.cpuTimes:
-                        current_process.cpuTimes[0] -= 1
-                        current_process.usedTimeQuantum += 1
-                        current_process.usedTimeAllotment += 1
-
-                        # If a CPU burst is done, it means that the process is either finished or going to I/O.
-                        if current_process.cpuTimes[0] == 0:
-                            current_process.cpuTimes.pop(0)
-                            if current_process.ioTimes:
-                                current_process.usedTimeQuantum = 0
-                                current_process.usedTimeAllotment = 0
-                                MLFQ.ioProcesses.append(current_process)
-                            elif not current_process.cpuTimes:
-                                current_process.currentQueue = NULL_QUEUE_PRIORITY
-                                current_process.displayedDone = True
-                                current_process.completionTime = MLFQ.currentGlobalTime
-                                current_process.processCSTime = MLFQ.totalCSTime
-                            current_queue.pop(0)
-
-                        # If the Round Robin Time Allotment expires before the CPU burst is finished,
-                        # then demote the process to the FCFS Queue.
-
-                        elif current_process.currentQueue == RR_HIGH_PRIORITY and current_process.usedTimeAllotment == MLFQ.rrTimeAllotment:
-                            current_process.currentQueue = FCFS_MEDIUM_PRIORITY
-                            current_process.usedTimeAllotment = 0
-                            current_process.usedTimeQuantum = 0  # Not really necessary
-                            current_queue.pop(0)
-                            MLFQ.firstComeFirstServeQueue.append(current_process)
-                            current_process.recentDemotionTime = MLFQ.currentGlobalTime # Track demotion time
+    def close(self):
+        pass
 
-                        # If the Round Robin Time Quantum expires before the CPU burst is finished,
-                        # then switch out the process.
 
-                        elif current_process.currentQueue == RR_HIGH_PRIORITY and current_process.usedTimeQuantum == MLFQ.rrTimeQuantum:
-                            current_process.usedTimeQuantum = 0
-                            current_queue.pop(0)
-                            current_queue.append(current_process)
-
-                        # If the FCFS Time Allotment expires before the CPU burst is finished,
-                        # then demote the process to the SJF Queue.
-
-                        elif current_process.currentQueue == FCFS_MEDIUM_PRIORITY and current_process.usedTimeAllotment == MLFQ.fcfsTimeAllotment:
-                            current_process.currentQueue = SJF_LOW_PRIORITY
-                            current_process.usedTimeAllotment = 0  # Not really necessary
-                            current_process.usedTimeQuantum = 0  # Not really necessary
-                            current_queue.pop(0)
-                            MLFQ.shortestJobFirstQueue.append(current_process)
-                            current_process.recentDemotionTime = MLFQ.currentGlobalTime # Track demotion time
-
-                        elif current_process.currentQueue == SJF_LOW_PRIORITY:
-                            current_queue.pop(0)
-                            current_queue.append(current_process)
-
-                    # # Handle Context Switching between different processes.
-                    # if current_queue and MLFQ.recentRunningProcess != current_queue[0].processID:
-
-                    #     if MLFQ.contextSwitch > 0:
-                    #         MLFQ.recentRunningProcess = 0
-                    #         print_mlfq_state(MLFQ, process_list, current_running_process)
-                    #         MLFQ.currentGlobalTime += MLFQ.contextSwitch
-                    #         MLFQ.totalCSTime += MLFQ.contextSwitch
-
-                    #     MLFQ.recentRunningProcess = current_queue[0].processID
-                    #     current_running_process = current_queue[0]  # Update the currently running process
-
-                    # Handle Context Switching between different processes (version 2 -- with handling of simultaneous I/O)
-                    if current_queue and MLFQ.recentRunningProcess != current_queue[0].processID:
-
-                        if MLFQ.contextSwitch > 0:
-                            MLFQ.recentRunningProcess = 0
-                            print_mlfq_state(MLFQ, process_list, current_running_process)
-                            
-                            # Handle each timestep of the context switch
-                            for _ in range(MLFQ.contextSwitch):
-                                # Decrement I/O times for all processes in I/O
-                                for process in MLFQ.ioProcesses:
-                                    if process.ioTimes:
-                                        process.ioTimes[0] -= 1
-                                        
-                                # Remove processes whose I/O bursts have completed
-                                for process in list(MLFQ.ioProcesses):  # Use a copy to avoid mutation issues
-                                    if process.ioTimes and process.ioTimes[0] == 0:
-                                        process.ioTimes.pop(0)
-                                        MLFQ.ioProcesses.remove(process)
-                                        
-                                        # Add process back to the appropriate queue or mark as completed
-                                        if process.cpuTimes:
-                                            if process.currentQueue == RR_HIGH_PRIORITY:
-                                                MLFQ.roundRobinQueue.append(process)
-                                            elif process.currentQueue == FCFS_MEDIUM_PRIORITY:
-                                                MLFQ.firstComeFirstServeQueue.append(process)
-                                            elif process.currentQueue == SJF_LOW_PRIORITY:
-                                                MLFQ.shortestJobFirstQueue.append(process)
-                                        else:
-                                            process.currentQueue = NULL_QUEUE_PRIORITY
-                                            process.displayedDone = True
-                                            process.completionTime = MLFQ.currentGlobalTime
-                                            process.processCSTime = MLFQ.totalCSTime
-
-                                # Increment global time for each step of the context switch
-                                MLFQ.currentGlobalTime += 1
-                                
-                            MLFQ.totalCSTime += MLFQ.contextSwitch
-
-                        MLFQ.recentRunningProcess = current_queue[0].processID
-                        current_running_process = current_queue[0]  # Update the currently running process
-
-                    break  # Remember, queues can only be ran, one at a time, based on the priority order.
+class TextTraceSink(TraceSink):
+    def __init__(self, level=TRACE_FULL):
+        super().__init__(level)
+
+    def state(self, MLFQ: MLFQ, process_list: list[Process]):
+        print_mlfq_state(MLFQ, process_list, MLFQ.currentRunningProcess)
+
+    def event(self, time: int, kind: str, process: Process):
+        print(f"At Time = {time}: {process.processName} {TRACE_EVENT_TEXT[kind]}")
 
+    def summary(self, process_list: list[Process]):
+        if self.level == TRACE_OFF:
+            super().summary(process_list)
         else:
-            MLFQ.recentRunningProcess = MLFQ.roundRobinQueue[0].processID
+            print_simulation_summary(process_list)
+
+    def summary_statistics(self, statistics: SummaryStatistics):
+        if self.level != TRACE_OFF:
+            print_summary_statistics(statistics)
+
+
+def _state_snapshot(MLFQ: MLFQ):
+    # The same information print_mlfq_state() shows, except that the queues are listed in full
+    # and the CPU holds the process that is actually given the CPU (None during a context switch).
+    cpu_process = None
+    if MLFQ.recentRunningProcess:
+        if MLFQ.roundRobinQueue:
+            cpu_process = MLFQ.roundRobinQueue[0]
+        elif MLFQ.firstComeFirstServeQueue:
+            cpu_process = MLFQ.firstComeFirstServeQueue[0]
+        elif MLFQ.shortestJobFirstQueue:
+            cpu_process = MLFQ.shortestJobFirstQueue.peek()
+
+    return {
+        "done": _take_undisplayed_done_processes(MLFQ),
+        "arriving": [p for p in MLFQ.roundRobinQueue if p.arrivalTime == MLFQ.currentGlobalTime],
+        "queues": [list(MLFQ.roundRobinQueue), list(MLFQ.firstComeFirstServeQueue), list(MLFQ.shortestJobFirstQueue)],
+        "cpu": cpu_process,
+        "io": list(MLFQ.ioProcesses),
+        "demoted": _demoted_processes(MLFQ),
+    }
+
+
+class JsonlTraceSink(TraceSink):
+    # One JSON object per line: a "run" record per simulation, then "event" or "state" records,
+    # then one "result" record per process and an "average_turnaround" record.
+    def __init__(self, path: str, level=TRACE_EVENTS, buffer_size: int = 1 << 20):
+        super().__init__(level)
+        self.file = open(path, "w", buffering=buffer_size)
+
+    def _write(self, record: dict):
+        self.file.write(json.dumps(record, separators=(",", ":")))
+        self.file.write("\n")
+
+    def begin_run(self, MLFQ: MLFQ, label: str):
+        if self.level != TRACE_OFF:
+            self._write({"run": label, "rr_allotment": MLFQ.rrTimeAllotment, "fcfs_allotment": MLFQ.fcfsTimeAllotment,
+                         "context_switch": MLFQ.contextSwitch, "rr_quantum": MLFQ.rrTimeQuantum})
+
+    def state(self, MLFQ: MLFQ, process_list: list[Process]):
+        snapshot = _state_snapshot(MLFQ)
+        self._write({
+            "t": MLFQ.currentGlobalTime,
+            "done": [p.processName for p in snapshot["done"]],
+            "arriving": [p.processName for p in snapshot["arriving"]],
+            "queues": [[p.processName for p in queue] for queue in snapshot["queues"]],
+            "cpu": snapshot["cpu"].processName if snapshot["cpu"] else None,
+            "io": [p.processName for p in snapshot["io"]],
+            "demoted": [p.processName for p in snapshot["demoted"]],
+        })
+
+    def event(self, time: int, kind: str, process: Process):
+        self._write({"t": time, "event": kind, "process": process.processName, "queue": process.currentQueue})
+
+    def summary(self, process_list: list[Process]):
+        super().summary(process_list)
+        if self.level == TRACE_OFF or not process_list:
+            return
+
+        for process in sorted(process_list, key=lambda p: p.processName):
+            self._write({"result": process.processName, "arrival": process.arrivalTime, "completion": process.completionTime,
+                         "turnaround": process.turnaroundTime, "waiting": process.waitingTime})
+        self._write({"average_turnaround": sum(p.turnaroundTime for p in process_list) / len(process_list)})
+
+    def summary_statistics(self, statistics: SummaryStatistics):
+        if self.level != TRACE_OFF:
+            self._write({"statistics": statistics.report()})
+
+    def close(self):
+        self.file.close()
+
+
+# Binary trace layout (little-endian). The file starts with BINARY_TRACE_MAGIC, followed by records that each
+# start with a one-byte record kind. Processes are referred to by processID; a NAME record maps an ID to its
+# name the first time the ID shows up in a run.
+
+BINARY_TRACE_MAGIC = b"MLFQTRC1"
+
+TRACE_RECORD_RUN = 1  # rr_allotment, fcfs_allotment, context_switch, rr_quantum, label length, then the label
+TRACE_RECORD_NAME = 2  # processID, name length, then the name
+TRACE_RECORD_EVENT = 3  # time, processID, event kind (1-based index in TRACE_EVENT_KINDS), queue
+TRACE_RECORD_STATE = 4  # time, CPU processID (0 if none), 7 list lengths, then the processIDs of every list
+TRACE_RECORD_RESULT = 5  # processID, arrival, completion, turnaround and waiting time
+TRACE_RECORD_STATISTICS = 6  # group and metric (indices in _STATISTICS_GROUPS and SUMMARY_METRICS), count, mean, min, max, percentiles
+
+_RUN_RECORD = struct.Struct("<BqqqqH")
+_NAME_RECORD = struct.Struct("<BIH")
+_EVENT_RECORD = struct.Struct("<BqIBB")
+_STATE_RECORD = struct.Struct("<BqI7I")
+_RESULT_RECORD = struct.Struct("<BIqqqq")
+_STATISTICS_RECORD = struct.Struct("<BBBqdqq" + "d" * len(SUMMARY_PERCENTILES))
+
+_STATISTICS_GROUPS = ["all"] + list(SUMMARY_LEVELS.values())
+
+_STATE_LISTS = ["done", "arriving", "rr", "fcfs", "sjf", "io", "demoted"]
+
+
+class BinaryTraceSink(TraceSink):
+    def __init__(self, path: str, level=TRACE_EVENTS, buffer_size: int = 1 << 20):
+        super().__init__(level)
+        self.file = open(path, "wb", buffering=buffer_size)
+        self.file.write(BINARY_TRACE_MAGIC)
+        self.namedProcesses = set()
+
+    def _process_id(self, process: Process):
+        if process.processID not in self.namedProcesses:
+            self.namedProcesses.add(process.processID)
+            name = process.processName.encode()
+            self.file.write(_NAME_RECORD.pack(TRACE_RECORD_NAME, process.processID, len(name)))
+            self.file.write(name)
+        return process.processID
+
+    def begin_run(self, MLFQ: MLFQ, label: str):
+        self.namedProcesses = set()
+        if self.level != TRACE_OFF:
+            encoded_label = label.encode()
+            self.file.write(_RUN_RECORD.pack(TRACE_RECORD_RUN, MLFQ.rrTimeAllotment, MLFQ.fcfsTimeAllotment,
+                                             MLFQ.contextSwitch, MLFQ.rrTimeQuantum, len(encoded_label)))
+            self.file.write(encoded_label)
+
+    def state(self, MLFQ: MLFQ, process_list: list[Process]):
+        snapshot = _state_snapshot(MLFQ)
+        lists = [snapshot["done"], snapshot["arriving"], *snapshot["queues"], snapshot["io"], snapshot["demoted"]]
+        process_ids = [self._process_id(p) for processes in lists for p in processes]
+        cpu_id = self._process_id(snapshot["cpu"]) if snapshot["cpu"] else 0
+        self.file.write(_STATE_RECORD.pack(TRACE_RECORD_STATE, MLFQ.currentGlobalTime, cpu_id, *(len(processes) for processes in lists)))
+        self.file.write(struct.pack(f"<{len(process_ids)}I", *process_ids))
+
+    def event(self, time: int, kind: str, process: Process):
+        process_id = self._process_id(process)
+        self.file.write(_EVENT_RECORD.pack(TRACE_RECORD_EVENT, time, process_id, TRACE_EVENT_KINDS.index(kind) + 1, process.currentQueue))
+
+    def summary(self, process_list: list[Process]):
+        super().summary(process_list)
+        if self.level == TRACE_OFF:
+            return
+
+        for process in sorted(process_list, key=lambda p: p.processName):
+            process_id = self._process_id(process)
+            self.file.write(_RESULT_RECORD.pack(TRACE_RECORD_RESULT, process_id, process.arrivalTime, process.completionTime,
+                                                process.turnaroundTime, process.waitingTime))
+
+    def summary_statistics(self, statistics: SummaryStatistics):
+        if self.level == TRACE_OFF:
+            return
+
+        for group, metrics in statistics.report().items():
+            for metric, figures in metrics.items():
+                self.file.write(_STATISTICS_RECORD.pack(TRACE_RECORD_STATISTICS, _STATISTICS_GROUPS.index(group), SUMMARY_METRICS.index(metric),
+                                                        figures["count"], figures["mean"], figures["min"], figures["max"],
+                                                        *(figures[f"p{percentile}"] for percentile in SUMMARY_PERCENTILES)))
+
+    def close(self):
+        self.file.close()
+
+
+def read_binary_trace(path: str):
+    # Yields the records of a file written by BinaryTraceSink as dictionaries, with process names resolved.
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(BINARY_TRACE_MAGIC):
+        raise ValueError(f"{path} is not a binary MLFQ trace")
+
+    names = {}
+    offset = len(BINARY_TRACE_MAGIC)
+    while offset < len(data):
+        kind = data[offset]
+        if kind == TRACE_RECORD_RUN:
+            _, rr_allotment, fcfs_allotment, context_switch, rr_quantum, length = _RUN_RECORD.unpack_from(data, offset)
+            offset += _RUN_RECORD.size
+            names = {}
+            yield {"run": data[offset:offset + length].decode(), "rr_allotment": rr_allotment, "fcfs_allotment": fcfs_allotment,
+                   "context_switch": context_switch, "rr_quantum": rr_quantum}
+            offset += length
+        elif kind == TRACE_RECORD_NAME:
+            _, process_id, length = _NAME_RECORD.unpack_from(data, offset)
+            offset += _NAME_RECORD.size
+            names[process_id] = data[offset:offset + length].decode()
+            offset += length
+        elif kind == TRACE_RECORD_EVENT:
+            _, time, process_id, event_kind, queue = _EVENT_RECORD.unpack_from(data, offset)
+            offset += _EVENT_RECORD.size
+            yield {"t": time, "event": TRACE_EVENT_KINDS[event_kind - 1], "process": names[process_id], "queue": queue}
+        elif kind == TRACE_RECORD_STATE:
+            _, time, cpu_id, *lengths = _STATE_RECORD.unpack_from(data, offset)
+            offset += _STATE_RECORD.size
+            process_ids = struct.unpack_from(f"<{sum(lengths)}I", data, offset)
+            offset += 4 * sum(lengths)
+            record = {"t": time, "cpu": names[cpu_id] if cpu_id else None}
+            start = 0
+            for list_name, length in zip(_STATE_LISTS, lengths):
+                record[list_name] = [names[process_id] for process_id in process_ids[start:start + length]]
+                start += length
+            yield record
+        elif kind == TRACE_RECORD_RESULT:
+            _, process_id, arrival, completion, turnaround, waiting = _RESULT_RECORD.unpack_from(data, offset)
+            offset += _RESULT_RECORD.size
+            yield {"result": names[process_id], "arrival": arrival, "completion": completion,
+                   "turnaround": turnaround, "waiting": waiting}
+        elif kind == TRACE_RECORD_STATISTICS:
+            _, group, metric, count, mean, minimum, maximum, *percentiles = _STATISTICS_RECORD.unpack_from(data, offset)
+            offset += _STATISTICS_RECORD.size
+            record = {"statistics": _STATISTICS_GROUPS[group], "metric": SUMMARY_METRICS[metric], "count": count,
+                      "mean": mean, "min": minimum, "max": maximum}
+            record.update((f"p{percentile}", value) for percentile, value in zip(SUMMARY_PERCENTILES, percentiles))
+            yield record
+        else:
+            raise ValueError(f"Unknown record kind {kind} at byte {offset} of {path}")
+
+
+# Instrumentation. Both parts are off unless they are set on the MLFQ before a run, in which case
+# the engines only pay for a None check per time step:
+#   MLFQ.metrics = Metrics()     counters fed by the trace events, and histograms of the queue lengths
+#                                and of the number of processes doing I/O, weighted by the ms they lasted
+#   MLFQ.profile = PhaseTimer()  wall-clock seconds spent on each phase of the time steps
+
+
+_DEMOTION_COUNTERS = {FCFS_MEDIUM_PRIORITY: "demotions_to_fcfs", SJF_LOW_PRIORITY: "demotions_to_sjf"}
+
+METRICS_HISTOGRAMS = ["rr_queue_length", "fcfs_queue_length", "sjf_queue_length", "io_concurrency"]
+
+_METRICS_EVENT_COUNTERS = {
+    "arrive": "arrivals",
+    "dispatch": "dispatches",
+    "quantum_expired": "quantum_expirations",
+    "io_start": "io_bursts_started",
+    "io_finish": "io_bursts_finished",
+    "context_switch": "context_switches",
+    "done": "completions",
+}
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {name: {} for name in METRICS_HISTOGRAMS}  # value -> ms
+        self.sampleTime = 0
+        self.sampledValues = None
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, value: int, weight: int = 1):
+        histogram = self.histograms.setdefault(name, {})
+        histogram[value] = histogram.get(value, 0) + weight
+
+    def event(self, time: int, kind: str, process: Process):
+        if kind == "demote":
+            self.count(_DEMOTION_COUNTERS[process.currentQueue])
+        else:
+            self.count(_METRICS_EVENT_COUNTERS[kind])
+
+    def sample(self, MLFQ: MLFQ):
+        # The values sampled last time held until now.
+        if self.sampledValues is not None and MLFQ.currentGlobalTime > self.sampleTime:
+            for name, value in zip(METRICS_HISTOGRAMS, self.sampledValues):
+                self.observe(name, value, MLFQ.currentGlobalTime - self.sampleTime)
+        self.sampleTime = MLFQ.currentGlobalTime
+        self.sampledValues = (len(MLFQ.roundRobinQueue), len(MLFQ.firstComeFirstServeQueue),
+                              len(MLFQ.shortestJobFirstQueue), len(MLFQ.ioProcesses))
+
+    def report(self, MLFQ: MLFQ):
+        return {
+            "simulated_ms": MLFQ.currentGlobalTime,
+            "cpu_busy_ms": MLFQ.totalCPUTime,
+            "context_switch_ms": MLFQ.totalCSTime,
+            "cpu_idle_ms": MLFQ.currentGlobalTime - MLFQ.totalCPUTime - MLFQ.totalCSTime,
+            "counters": dict(sorted(self.counters.items())),
+            "histograms": {name: dict(sorted(histogram.items())) for name, histogram in self.histograms.items()},
+        }
+
+
+PROFILE_PHASES = ["arrival", "io", "dispatch", "context_switch", "skip", "state"]
+
+
+class PhaseTimer:
+    # Every lap() adds the time since the previous lap to the given phase.
+    def __init__(self):
+        self.seconds = {phase: 0.0 for phase in PROFILE_PHASES}
+        self.lastLap = perf_counter()
+
+    def start(self):
+        self.lastLap = perf_counter()
+
+    def lap(self, phase: str):
+        now = perf_counter()
+        self.seconds[phase] += now - self.lastLap
+        self.lastLap = now
+
+    def report(self):
+        return dict(self.seconds)
+
+
+class _MetricsTraceSink(TraceSink):
+    # Passes the trace events on to the metrics, and to the trace only if it reports events.
+    def __init__(self, trace: TraceSink, metrics: Metrics):
+        super().__init__(trace.level)
+        self.aggregate = trace.aggregate
+        self.trace = trace
+        self.metrics = metrics
+
+    def begin_run(self, MLFQ: MLFQ, label: str):
+        self.trace.begin_run(MLFQ, label)
+
+    def state(self, MLFQ: MLFQ, process_list: list[Process]):
+        self.trace.state(MLFQ, process_list)
+
+    def event(self, time: int, kind: str, process: Process):
+        self.metrics.event(time, kind, process)
+        if self.level == TRACE_EVENTS:
+            self.trace.event(time, kind, process)
+
+    def summary(self, process_list: list[Process]):
+        self.trace.summary(process_list)
+
+    def summary_statistics(self, statistics: SummaryStatistics):
+        self.trace.summary_statistics(statistics)
+
+    def close(self):
+        self.trace.close()
+
+
+def _attach_trace(MLFQ: MLFQ, trace: TraceSink):
+    MLFQ.trace = trace if MLFQ.metrics is None else _MetricsTraceSink(trace, MLFQ.metrics)
+    MLFQ.traceEvents = trace.level == TRACE_EVENTS or MLFQ.metrics is not None
+    MLFQ.traceStates = trace.level == TRACE_FULL
+    if trace.aggregate and MLFQ.summaryStats is None:
+        MLFQ.summaryStats = SummaryStatistics()
+    if MLFQ.metrics is not None:
+        MLFQ.metrics.sample(MLFQ)
+    if MLFQ.profile is not None:
+        MLFQ.profile.start()
+
+
+def _attach_processes(MLFQ: MLFQ, process_list):
+    # Processes read lazily are only kept around if the trace has a summary to report on.
+    # process_list is None when a paused or restored run carries on.
+    if process_list is not None:
+        MLFQ.processList = process_list if isinstance(process_list, list) else None
+        MLFQ.arrivals = ArrivalStream(process_list, retain=MLFQ.processList is None and MLFQ.trace.level != TRACE_OFF and not MLFQ.trace.aggregate)
+    return MLFQ.processList
+
+
+def _finished_process_list(MLFQ: MLFQ):
+    return MLFQ.processList if MLFQ.processList is not None else MLFQ.arrivals.drain()
+
+
+def _finish_run(MLFQ: MLFQ):
+    MLFQ.finished = True
+    if MLFQ.trace.aggregate:
+        MLFQ.trace.summary_statistics(MLFQ.summaryStats)
+    else:
+        MLFQ.trace.summary(_finished_process_list(MLFQ))
+
+
+def _requeue_process(MLFQ: MLFQ, process: Process):
+    # Add process back to the queue of its current priority level.
+    if process.currentQueue == RR_HIGH_PRIORITY:
+        MLFQ.roundRobinQueue.append(process)
+    elif process.currentQueue == FCFS_MEDIUM_PRIORITY:
+        MLFQ.firstComeFirstServeQueue.append(process)
+    elif process.currentQueue == SJF_LOW_PRIORITY:
+        MLFQ.shortestJobFirstQueue.push(process)
+
+
+def _mark_done(MLFQ: MLFQ, process: Process, time: int):
+    process.completionTime = time
+    process.processCSTime = MLFQ.totalCSTime
+    if MLFQ.summaryStats is not None:
+        _compute_turnaround_and_waiting(process)
+        MLFQ.summaryStats.add(process, process.currentQueue)
+    process.currentQueue = NULL_QUEUE_PRIORITY
+    process.displayedDone = True
+    if MLFQ.traceStates:
+        MLFQ.undisplayedDoneProcesses.append(process)
+    if MLFQ.traceEvents:
+        MLFQ.trace.event(time, "done", process)
+
+
+def _admit_arrivals(MLFQ: MLFQ):
+    # Add newly arriving processes to the highest priority queue: the Round Robin Queue.
+    # Processes arrive in order of arrival time, so only the processes that are due now
+    # have to be looked at. A process whose arrival time was jumped over by a context
+    # switch is passed by without ever arriving.
+    while MLFQ.arrivals.peek() is not None and MLFQ.arrivals.peek().arrivalTime <= MLFQ.currentGlobalTime:
+        process = MLFQ.arrivals.pop()
+        if process.arrivalTime == MLFQ.currentGlobalTime:
+            MLFQ.roundRobinQueue.append(process)
+            if MLFQ.traceEvents:
+                MLFQ.trace.event(MLFQ.currentGlobalTime, "arrive", process)
+
+
+def _finish_io_burst(MLFQ: MLFQ, process: Process, time: int):
+    if MLFQ.traceEvents:
+        MLFQ.trace.event(time, "io_finish", process)
+
+    # Add process back to the appropriate queue or mark as completed
+    if process.next_burst():
+        _requeue_process(MLFQ, process)
+    else:
+        _mark_done(MLFQ, process, time)
+
+
+def _advance_io(MLFQ: MLFQ):
+    # Move every I/O burst forward by one time step and requeue the processes whose I/O is done.
+    for _, process in MLFQ.ioProcesses.advance():
+        _finish_io_burst(MLFQ, process, MLFQ.currentGlobalTime)
+        process.completionTime = MLFQ.currentGlobalTime
+        process.processCSTime = MLFQ.totalCSTime
+
+
+def _advance_io_during_context_switch(MLFQ: MLFQ):
+    # Handle each timestep of the context switch
+    for _ in range(MLFQ.contextSwitch):
+        for _, process in MLFQ.ioProcesses.advance():
+            _finish_io_burst(MLFQ, process, MLFQ.currentGlobalTime)
+
+        # Increment global time for each step of the context switch
+        MLFQ.currentGlobalTime += 1
+
+
+def _skip_context_switch(MLFQ: MLFQ):
+    # Same outcome as _advance_io_during_context_switch(), but jumps over the whole
+    # context switch at once. A burst that finishes after `steps` ms of the switch
+    # is stamped with the time of step `steps - 1`, as the ms-by-ms loop does.
+    start_time = MLFQ.currentGlobalTime
+    for steps, process in MLFQ.ioProcesses.advance(MLFQ.contextSwitch):
+        _finish_io_burst(MLFQ, process, start_time + steps - 1)
+
+    MLFQ.currentGlobalTime += MLFQ.contextSwitch
+
+
+def _run_time_step(MLFQ: MLFQ, process_list: list[Process], event_driven: bool = False):
+    MLFQ.recentlyDemotedProcesses = []
+    profile = MLFQ.profile
+
+    # Step 1: Add newly arriving processes to the highest priority queue: the Round Robin Queue.
+    _admit_arrivals(MLFQ)
+    if profile is not None:
+        profile.lap("arrival")
+
+    if MLFQ.currentGlobalTime > 0:
+        # Step 2: Handle IO processes, if any. Decrement I/O bursts per time step and check for CPU burst times.
+        _advance_io(MLFQ)
+        MLFQ.shortestJobFirstQueue.reorder()
+        if profile is not None:
+            profile.lap("io")
+        # Step 3: Process CPU bursts and handle queue transitions.
+        for current_queue in [MLFQ.roundRobinQueue, MLFQ.firstComeFirstServeQueue, MLFQ.shortestJobFirstQueue]:
+            if current_queue:
+                if current_queue is MLFQ.shortestJobFirstQueue:
+                    # Order the SJF queue based on remaining CPU burst time
+                    current_queue.reorder(by_remaining_time=True)
+                    current_process = current_queue.peek()
+                else:
+                    current_process = current_queue[0]
+                rotated_sjf_process = False
+
+                # Check if a higher priority process is ready to run
+                if MLFQ.currentRunningProcess and MLFQ.currentRunningProcess.currentQueue > current_process.currentQueue:
+                    # If a higher priority process is ready, do not switch if a lower priority process is running
+                    break
+
+                if current_process is not MLFQ.lastDispatchedProcess:
+                    MLFQ.lastDispatchedProcess = current_process
+                    if current_process.firstRunTime < 0:
+                        current_process.firstRunTime = MLFQ.currentGlobalTime  # The time of its first RUNNING event.
+                    MLFQ.dispatchCount += 1
+                    if MLFQ.traceEvents:
+                        MLFQ.trace.event(MLFQ.currentGlobalTime, "dispatch", current_process)
+
+                # Decrement CPU bursts per time step. In addition,
+                # increment the time quantum and time allotment used by the current process so far.
+
+                if current_process.remainingBurst:
+                    current_process.remainingBurst -= 1
+                    current_process.remainingCpuTime -= 1
+                    MLFQ.totalCPUTime += 1
+                    current_process.usedTimeQuantum += 1
+                    current_process.usedTimeAllotment += 1
+                    if current_queue is MLFQ.shortestJobFirstQueue:
+                        current_queue.update_top()
+
+                    # If a CPU burst is done, it means that the process is either finished or going to I/O.
+                    if current_process.remainingBurst == 0:
+                        if current_process.next_burst():
+                            current_process.usedTimeQuantum = 0
+                            current_process.usedTimeAllotment = 0
+                            MLFQ.ioProcesses.append(current_process)
+                            if MLFQ.traceEvents:
+                                MLFQ.trace.event(MLFQ.currentGlobalTime, "io_start", current_process)
+                        else:
+                            _mark_done(MLFQ, current_process, MLFQ.currentGlobalTime)
+                        if current_queue is MLFQ.shortestJobFirstQueue:
+                            current_queue.pop()
+                        else:
+                            current_queue.popleft()
+
+                    # If the Round Robin Time Allotment expires before the CPU burst is finished,
+                    # then demote the process to the FCFS Queue.
+
+                    elif current_process.currentQueue == RR_HIGH_PRIORITY and current_process.usedTimeAllotment == MLFQ.rrTimeAllotment:
+                        current_process.currentQueue = FCFS_MEDIUM_PRIORITY
+                        current_process.usedTimeAllotment = 0
+                        current_process.usedTimeQuantum = 0  # Not really necessary
+                        current_queue.popleft()
+                        MLFQ.firstComeFirstServeQueue.append(current_process)
+                        current_process.recentDemotionTime = MLFQ.currentGlobalTime # Track demotion time
+                        MLFQ.recentlyDemotedProcesses.append(current_process)
+                        if MLFQ.traceEvents:
+                            MLFQ.trace.event(MLFQ.currentGlobalTime, "demote", current_process)
+
+                    # If the Round Robin Time Quantum expires before the CPU burst is finished,
+                    # then switch out the process.
+
+                    elif current_process.currentQueue == RR_HIGH_PRIORITY and current_process.usedTimeQuantum == MLFQ.rrTimeQuantum:
+                        current_process.usedTimeQuantum = 0
+                        current_queue.popleft()
+                        current_queue.append(current_process)
+                        if MLFQ.traceEvents:
+                            MLFQ.trace.event(MLFQ.currentGlobalTime, "quantum_expired", current_process)
+
+                    # If the FCFS Time Allotment expires before the CPU burst is finished,
+                    # then demote the process to the SJF Queue.
+
+                    elif current_process.currentQueue == FCFS_MEDIUM_PRIORITY and current_process.usedTimeAllotment == MLFQ.fcfsTimeAllotment:
+                        current_process.currentQueue = SJF_LOW_PRIORITY
+                        current_process.usedTimeAllotment = 0  # Not really necessary
+                        current_process.usedTimeQuantum = 0  # Not really necessary
+                        current_queue.popleft()
+                        MLFQ.shortestJobFirstQueue.push(current_process)
+                        current_process.recentDemotionTime = MLFQ.currentGlobalTime # Track demotion time
+                        MLFQ.recentlyDemotedProcesses.append(current_process)
+                        if MLFQ.traceEvents:
+                            MLFQ.trace.event(MLFQ.currentGlobalTime, "demote", current_process)
+
+                    elif current_process.currentQueue == SJF_LOW_PRIORITY:
+                        current_queue.rotate_top()
+                        rotated_sjf_process = True
+
+                # The process at the front of the queue after this time step. A rotated SJF process stays
+                # the shortest job, but it has been moved behind the runner-up.
+                if not current_queue:
+                    next_process = None
+                elif rotated_sjf_process and len(current_queue) > 1:
+                    next_process = current_queue.runner_up()
+                elif current_queue is MLFQ.shortestJobFirstQueue:
+                    next_process = current_queue.peek()
+                else:
+                    next_process = current_queue[0]
+
+                # Handle Context Switching between different processes (version 2 -- with handling of simultaneous I/O)
+                if next_process and MLFQ.recentRunningProcess != next_process.processID:
+
+                    if MLFQ.contextSwitch > 0:
+                        if profile is not None:
+                            profile.lap("dispatch")
+                        MLFQ.recentRunningProcess = 0
+                        if MLFQ.traceEvents:
+                            MLFQ.trace.event(MLFQ.currentGlobalTime, "context_switch", next_process)
+                        if MLFQ.traceStates:
+                            MLFQ.trace.state(MLFQ, process_list)
+
+                        if event_driven:
+                            _skip_context_switch(MLFQ)
+                        else:
+                            _advance_io_during_context_switch(MLFQ)
+
+                        MLFQ.totalCSTime += MLFQ.contextSwitch
+                        if profile is not None:
+                            profile.lap("context_switch")
+
+                    MLFQ.recentRunningProcess = next_process.processID
+                    MLFQ.currentRunningProcess = next_process  # Update the currently running process
+
+                break  # Remember, queues can only be ran, one at a time, based on the priority order.
+
+    else:
+        MLFQ.recentRunningProcess = MLFQ.roundRobinQueue[0].processID
+
+    if profile is not None:
+        profile.lap("dispatch")
+
+
+def run_mlfq_scheduler(MLFQ: MLFQ, process_list, trace: TraceSink = None, until: int = None):
+    # process_list has to be ordered by arrival time: either the list parse_input() returns,
+    # or the lazy iterator from read_input().
+    # By default the state of the MLFQ is printed every ms, followed by the summary.
+    # With `until`, the run is paused once the time reaches it and False is returned (True means the
+    # run has finished). Pass None as process_list to carry on with a paused or restored run.
+    _attach_trace(MLFQ, trace if trace is not None else TextTraceSink(TRACE_FULL))
+    process_list = _attach_processes(MLFQ, process_list)
+    if MLFQ.finished:
+        return True
+
+    while until is None or MLFQ.currentGlobalTime < until:
+        _run_time_step(MLFQ, process_list)
 
         # Print the current state of MLFQ.
-        print_mlfq_state(MLFQ, process_list, current_running_process)
+        if MLFQ.traceStates:
+            MLFQ.trace.state(MLFQ, process_list)
+            if MLFQ.profile is not None:
+                MLFQ.profile.lap("state")
 
         # Increment global time.
         MLFQ.currentGlobalTime += 1
+        if MLFQ.metrics is not None:
+            MLFQ.metrics.sample(MLFQ)
 
         # This stops the scheduler if at any point in time, except for at t = 0,
         # all three of the queues are empty at the same time. 
 
         if not (MLFQ.roundRobinQueue or MLFQ.firstComeFirstServeQueue or MLFQ.shortestJobFirstQueue):
-            print_simulation_summary(process_list)
+            _finish_run(MLFQ)
+            return True
+
+    return False
+
+
+# The event-driven engine below produces the same completion, turnaround and waiting times as
+# run_mlfq_scheduler(), but it does not walk the timeline 1 ms at a time. Between two scheduling
+# decisions (an arrival, the end of a CPU or I/O burst, a quantum or allotment expiring, or a
+# context switch) every time step only counts bursts down, so those steps are skipped in one go.
+
+
+def _steps_until_next_event(MLFQ: MLFQ):
+    # Returns how many of the upcoming time steps (starting at MLFQ.currentGlobalTime)
+    # cannot change anything but the burst and usage counters, or None if nothing will ever happen.
+    steps = None
+
+    def bound(limit):
+        nonlocal steps
+        if steps is None or limit < steps:
+            steps = limit
+
+    # A process whose arrival time has already passed is dropped by the next full time step.
+    next_arrival = MLFQ.arrivals.peek()
+    if next_arrival is not None:
+        bound(max(next_arrival.arrivalTime - MLFQ.currentGlobalTime, 0))
+
+    if MLFQ.ioProcesses:
+        bound(MLFQ.ioProcesses.steps_until_next_finish() - 1)
+
+    for current_queue in [MLFQ.roundRobinQueue, MLFQ.firstComeFirstServeQueue, MLFQ.shortestJobFirstQueue]:
+        if current_queue:
+            if current_queue is MLFQ.shortestJobFirstQueue:
+                current_process = current_queue.peek()
+                # An SJF process is rotated to the back after every time step, so the
+                # context switch check looks at the runner-up instead of the process itself.
+                next_head = current_queue.runner_up() if len(current_queue) > 1 else current_process
+            else:
+                current_process = next_head = current_queue[0]
+
+            if MLFQ.currentRunningProcess and MLFQ.currentRunningProcess.currentQueue > current_process.currentQueue:
+                # Nothing runs until an arrival or an I/O completion changes the queues.
+                break
+
+            if not current_process.remainingBurst or MLFQ.recentRunningProcess != next_head.processID or current_process is not MLFQ.lastDispatchedProcess:
+                return 0
+
+            bound(current_process.remainingBurst - 1)
+            if current_process.currentQueue == RR_HIGH_PRIORITY:
+                if current_process.usedTimeAllotment < MLFQ.rrTimeAllotment:
+                    bound(MLFQ.rrTimeAllotment - current_process.usedTimeAllotment - 1)
+                if current_process.usedTimeQuantum < MLFQ.rrTimeQuantum:
+                    bound(MLFQ.rrTimeQuantum - current_process.usedTimeQuantum - 1)
+            elif current_process.currentQueue == FCFS_MEDIUM_PRIORITY:
+                if current_process.usedTimeAllotment < MLFQ.fcfsTimeAllotment:
+                    bound(MLFQ.fcfsTimeAllotment - current_process.usedTimeAllotment - 1)
+            return steps
+
+    return steps
+
+
+def _skip_time_steps(MLFQ: MLFQ, steps: int):
+    MLFQ.ioProcesses.advance(steps)  # No I/O burst finishes within the skipped steps.
+
+    for current_queue in [MLFQ.roundRobinQueue, MLFQ.firstComeFirstServeQueue, MLFQ.shortestJobFirstQueue]:
+        if current_queue:
+            if current_queue is MLFQ.shortestJobFirstQueue:
+                current_process = current_queue.peek()
+            else:
+                current_process = current_queue[0]
+
+            if not (MLFQ.currentRunningProcess and MLFQ.currentRunningProcess.currentQueue > current_process.currentQueue):
+                current_process.remainingBurst -= steps
+                current_process.remainingCpuTime -= steps
+                MLFQ.totalCPUTime += steps
+                current_process.usedTimeQuantum += steps
+                current_process.usedTimeAllotment += steps
+                if current_queue is MLFQ.shortestJobFirstQueue:
+                    current_queue.update_top()
             break
 
+    MLFQ.currentGlobalTime += steps
 
-if __name__ == "__main__":
-    # Parse set1.txt, use it to run the scheduler, and then output the results.
-    with open("set1.txt", "r") as file:
-        file_content = file.read()
 
-    num_processes, rr_allotment, fcfs_allotment, context_switch_time, process_list = parse_input(file_content)
-    first_MLFQ = MLFQ(rr_allotment, fcfs_allotment, context_switch_time)
-    run_mlfq_scheduler(first_MLFQ, process_list)
-    print()
-    
-    print("-" * 100)
+def run_mlfq_scheduler_event_driven(MLFQ: MLFQ, process_list, trace: TraceSink = None, until: int = None):
+    # By default only the summary is printed; the state of every ms cannot be traced from here.
+    # `until` and process_list=None work as they do for run_mlfq_scheduler().
+    if trace is None:
+        trace = TextTraceSink(TRACE_SUMMARY)
+    if trace.level == TRACE_FULL:
+        raise ValueError("The event-driven engine skips time steps, so it cannot trace the state every ms; use run_mlfq_scheduler().")
+    _attach_trace(MLFQ, trace)
+    process_list = _attach_processes(MLFQ, process_list)
+    if MLFQ.finished:
+        return True
+
+    while until is None or MLFQ.currentGlobalTime < until:
+        _run_time_step(MLFQ, process_list, event_driven=True)
+        MLFQ.currentGlobalTime += 1
+        if MLFQ.metrics is not None:
+            MLFQ.metrics.sample(MLFQ)
+
+        if not (MLFQ.roundRobinQueue or MLFQ.firstComeFirstServeQueue or MLFQ.shortestJobFirstQueue):
+            _finish_run(MLFQ)
+            return True
+
+        steps = _steps_until_next_event(MLFQ)
+        if steps is None:
+            raise RuntimeError(f"Scheduler stalled at Time = {MLFQ.currentGlobalTime}: no process can run again.")
+        if until is not None:
+            steps = min(steps, until - MLFQ.currentGlobalTime)
+        if steps > 0:
+            _skip_time_steps(MLFQ, steps)
+            if MLFQ.profile is not None:
+                MLFQ.profile.lap("skip")
+
+    return False
 
-    # Parse set2.txt, use it to run the scheduler, and then output the results.
-    with open("set2.txt", "r") as file:
-        file_content = file.read()
 
-        num_processes, rr_allotment, fcfs_allotment, context_switch_time, process_list = parse_input(file_content)
-        second_MLFQ = MLFQ(rr_allotment, fcfs_allotment, context_switch_time)
-        run_mlfq_scheduler(second_MLFQ, process_list)
+# A run paused with `until` can be saved as a checkpoint: a pickle of the MLFQ together with every
+# process, the queues and the arrivals still to come (but not the trace). Restoring a checkpoint gives
+# a scheduler to pass on to either engine with process_list=None. Forking restores a checkpoint with
+# other scheduler parameters, so that several variants can share the simulation of a common prefix.
+
+
+def checkpoint_scheduler(MLFQ: MLFQ):
+    return pickle.dumps(MLFQ, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def restore_scheduler(checkpoint: bytes):
+    return pickle.loads(checkpoint)
+
+
+def save_checkpoint(MLFQ: MLFQ, path: str):
+    # A streamed run has to be saved while its workload file is still open (see ArrivalStream.__getstate__()).
+    # The checkpoint is written next to path and renamed, so that a failed save leaves no truncated file.
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_path, "wb") as file:
+            pickle.dump(MLFQ, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temporary_path)
+
+
+def load_checkpoint(path: str):
+    with open(path, "rb") as file:
+        return pickle.load(file)
+
+
+def fork_scheduler(checkpoint: bytes, rr_allotment=None, fcfs_allotment=None, context_switch_time=None, rr_time_quantum=None):
+    # Parameters left as None keep their value from the checkpoint.
+    MLFQ = restore_scheduler(checkpoint)
+    if rr_allotment is not None:
+        MLFQ.rrTimeAllotment = rr_allotment
+    if fcfs_allotment is not None:
+        MLFQ.fcfsTimeAllotment = fcfs_allotment
+    if context_switch_time is not None:
+        MLFQ.contextSwitch = context_switch_time
+    if rr_time_quantum is not None:
+        MLFQ.rrTimeQuantum = rr_time_quantum
+
+    # The scheduler only checks whether a quantum or an allotment has been used up exactly, so a process
+    # that is already past a new, smaller limit is given the last ms of it instead.
+    for process in MLFQ.roundRobinQueue:
+        if process.usedTimeQuantum >= MLFQ.rrTimeQuantum > 0:
+            process.usedTimeQuantum = MLFQ.rrTimeQuantum - 1
+        if process.usedTimeAllotment >= MLFQ.rrTimeAllotment > 0:
+            process.usedTimeAllotment = MLFQ.rrTimeAllotment - 1
+    for process in MLFQ.firstComeFirstServeQueue:
+        if process.usedTimeAllotment >= MLFQ.fcfsTimeAllotment > 0:
+            process.usedTimeAllotment = MLFQ.fcfsTimeAllotment - 1
+    return MLFQ
+
+
+# Results of complete runs can be cached on disk, keyed by a hash of the workload (its process lines,
+# normalized the way parse_input() reads them), the scheduler parameters, whatever else decides the
+# outcome of the run and SCHEDULER_VERSION. An entry is a JSON file, or a text file holding the output
+# of a run; reading an entry marks it as recently used, and the least recently used entries are removed
+# once the cache outgrows its size.
+
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+# Process lines that are already written the way normalize_workload() writes them.
+_NORMALIZED_PROCESS_LINES = re.compile(r"(?:[^\s;][^;\n]*(?:;(?:0|[1-9][0-9]*))+(?:\n|\Z))*")
+
+
+def normalize_workload(file_content: str):
+    # The process lines of a workload, without the blank lines, whitespace and number formatting that do not change it.
+    sections = file_content.strip().split("\n", 4)
+    process_lines = sections[4].strip() if len(sections) > 4 else ""
+    if _NORMALIZED_PROCESS_LINES.fullmatch(process_lines):
+        return process_lines
+
+    normalized = []
+    for line in process_lines.split("\n"):
+        if line.strip():
+            name, *numbers = line.strip().split(";")
+            normalized.append(";".join([name] + [str(int(number)) for number in numbers]))
+    return "\n".join(normalized)
+
+
+def workload_digest(file_content: str):
+    return hashlib.sha256(normalize_workload(file_content).encode()).hexdigest()
+
+
+def result_cache_key(workload: str, **options):
+    # workload is the workload_digest() of the workload; options are the parameters and anything else the result depends on.
+    fields = {"version": SCHEDULER_VERSION, "workload": workload, **options}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory: str, max_size: int = DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.maxSize = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str, suffix: str = ".json"):
+        return os.path.join(self.directory, key + suffix)
+
+    def get(self, key: str):
+        # The entry stored under key, or None.
+        path = self._path(key)
+        try:
+            with open(path, "r") as file:
+                entry = json.load(file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def put(self, key: str, entry: dict):
+        # Entries bigger than the whole cache are not stored.
+        data = json.dumps(entry)
+        if len(data) > self.maxSize:
+            return
+        path = self._path(key)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as file:
+            file.write(data)
+        os.replace(temporary_path, path)  # Atomic, so that concurrent runs never read half an entry.
+        self._evict()
+
+    def open_output(self, key: str):
+        # The output stored under key, as a file open for reading, or None.
+        path = self._path(key, ".txt")
+        try:
+            file = open(path, "r")
+        except OSError:
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return file
+
+    def output_writer(self, key: str, stream):
+        return CachedOutputWriter(self, key, stream)
+
+    def _evict(self):
+        entries = []
+        total_size = 0
+        with os.scandir(self.directory) as directory:
+            for item in directory:
+                if item.name.endswith((".json", ".txt")):
+                    try:
+                        stat = item.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, item.path, stat.st_size))
+                    total_size += stat.st_size
+
+        entries.sort()
+        for _, path, size in entries:
+            if total_size <= self.maxSize:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total_size -= size
+
+
+
+class CachedOutputWriter:
+    # Writes the output of a run through to `stream` and into a temporary file, which commit() stores in the
+    # cache under key. Output that grows bigger than the whole cache is not stored.
+    def __init__(self, cache: ResultCache, key: str, stream):
+        self.cache = cache
+        self.stream = stream
+        self.path = cache._path(key, ".txt")
+        self.temporaryPath = f"{self.path}.{os.getpid()}.tmp"
+        self.file = open(self.temporaryPath, "w")
+        self.size = 0
+
+    def write(self, text: str):
+        self.stream.write(text)
+        if self.file is not None:
+            self.size += len(text)
+            if self.size > self.cache.maxSize:
+                self.discard()
+            else:
+                self.file.write(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.temporaryPath)
+
+    def commit(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            os.replace(self.temporaryPath, self.path)
+            self.cache._evict()
+
+
+def _run_input_file(input_file: str, scheduler, trace: TraceSink, separator: bool, stream: bool = False, until: int = None,
+                    metrics: bool = False, profile: bool = False, checkpoint: str = None):
+    if separator:
+        print("-" * 100)
+
+    # Parse the input file (or map a compiled one), use it to run the scheduler, and then output the results.
+    with contextlib.ExitStack() as stack:
+        if is_compiled_workload(input_file):
+            num_processes, rr_allotment, fcfs_allotment, context_switch_time, process_list = CompiledWorkload(input_file).parse(lazy=stream)
+        elif stream:
+            num_processes, rr_allotment, fcfs_allotment, context_switch_time, process_list = read_input(stack.enter_context(open(input_file, "r")))
+        else:
+            with open(input_file, "r") as file:
+                num_processes, rr_allotment, fcfs_allotment, context_switch_time, process_list = parse_input(file.read())
+
+        mlfq = MLFQ(rr_allotment, fcfs_allotment, context_switch_time)
+        _instrument(mlfq, metrics, profile)
+        trace.begin_run(mlfq, input_file)
+        _run_until(mlfq, process_list, scheduler, trace, until)
+        if checkpoint:
+            save_checkpoint(mlfq, checkpoint)
+    return mlfq
+
+
+def _run_input_file_cached(input_file: str, engine: str, scheduler, trace: TextTraceSink, separator: bool, stream: bool,
+                           cache: ResultCache):
+    # Prints what _run_input_file() would, from the cache if the same run was done before.
+    if separator:
+        print("-" * 100)
+
+    try:
+        if is_compiled_workload(input_file):
+            workload = CompiledWorkload(input_file)
+            digest = workload.digest()
+            num_processes, rr_allotment, fcfs_allotment, context_switch_time = (
+                workload.numProcesses, workload.rrTimeAllotment, workload.fcfsTimeAllotment, workload.contextSwitch)
+        else:
+            with open(input_file, "r") as file:
+                file_content = file.read()
+            digest = workload_digest(file_content)
+            num_processes, rr_allotment, fcfs_allotment, context_switch_time = [int(line) for line in file_content.strip().split("\n", 4)[:4]]
+        # The process count is part of the key because --stream checks it against the process lines.
+        key = result_cache_key(digest, engine=engine, trace=trace.level, aggregate=trace.aggregate, stream=stream,
+                               processes=num_processes, parameters=[rr_allotment, fcfs_allotment, context_switch_time, RR_TIME_QUANTUM])
+    except ValueError:
+        key = None  # Not a valid workload, which the run itself reports.
+
+    cached_output = cache.open_output(key) if key is not None else None
+    if cached_output is not None:
+        with cached_output:
+            shutil.copyfileobj(cached_output, sys.stdout)
+        return
+    if key is None:
+        _run_input_file(input_file, scheduler, trace, separator=False, stream=stream)
+        return
+
+    # The output is printed as the run goes, and only stored once the run has finished.
+    output = cache.output_writer(key, sys.stdout)
+    try:
+        with contextlib.redirect_stdout(output):
+            _run_input_file(input_file, scheduler, trace, separator=False, stream=stream)
+    except BaseException:
+        output.discard()
+        raise
+    output.commit()
+
+
+def _run_until(mlfq: MLFQ, process_list, scheduler, trace: TraceSink, until: int = None):
+    finished = scheduler(mlfq, process_list, trace, until)
+    if isinstance(trace, TextTraceSink):
+        if not finished:
+            print(f"Paused at Time = {mlfq.currentGlobalTime}")
         print()
 
+
+def _instrument(mlfq: MLFQ, metrics: bool, profile: bool):
+    # A resumed run keeps the metrics it was checkpointed with.
+    if metrics and mlfq.metrics is None:
+        mlfq.metrics = Metrics()
+    if profile and mlfq.profile is None:
+        mlfq.profile = PhaseTimer()
+
+
+def _report_instrumentation(mlfq: MLFQ, label: str, metrics_file):
+    # Metrics (with the phase times, if profiled) go to metrics_file as one JSON object per run;
+    # phase times alone are printed to stderr.
+    if metrics_file is not None:
+        report = {"run": label, **mlfq.metrics.report(mlfq)}
+        if mlfq.profile is not None:
+            report["phase_seconds"] = mlfq.profile.report()
+        metrics_file.write(json.dumps(report) + "\n")
+    elif mlfq.profile is not None:
+        print(f"Time per phase for {label}:", file=sys.stderr)
+        for phase, seconds in mlfq.profile.report().items():
+            print(f"  {phase:<15}{seconds:.6f} s", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate an MLFQ scheduler (RR -> FCFS -> SJF).")
+    parser.add_argument("input_files", nargs="*", help="workload files to simulate (default: set1.txt set2.txt)")
+    parser.add_argument("--engine", choices=["tick", "event"], default="tick",
+                        help="'tick' walks the timeline 1 ms at a time; 'event' jumps between scheduling events")
+    parser.add_argument("--trace", choices=list(TRACE_LEVELS),
+                        help="what to report: off, summary, events (every state change) or full (the MLFQ state every ms, tick engine only); "
+                             "default: full for the tick engine, summary for the event engine")
+    parser.add_argument("--trace-format", choices=["text", "jsonl", "binary"], default="text",
+                        help="print human-readable text (default), or write JSON lines or binary records to --trace-file")
+    parser.add_argument("--trace-file", help="output file for the jsonl and binary trace formats")
+    parser.add_argument("--stream", action="store_true",
+                        help="read each workload lazily while simulating instead of loading it first (processes must be listed in arrival order)")
+    parser.add_argument("--summary", choices=["processes", "aggregate"], default="processes",
+                        help="end each run with a line per process (default), or with streaming statistics and percentiles over the completed processes")
+    parser.add_argument("--stop-at", type=int, metavar="TIME", help="pause the run once the time reaches TIME ms")
+    parser.add_argument("--checkpoint", metavar="FILE", help="save the state of the run to FILE when it stops (one workload only)")
+    parser.add_argument("--resume", metavar="FILE", help="carry on with a run saved with --checkpoint instead of reading a workload")
+    parser.add_argument("--metrics", metavar="FILE", help="collect scheduler metrics and write them to FILE as one JSON object per run")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each phase of the simulation (added to the --metrics output, or else printed to stderr)")
+    parser.add_argument("--cache", metavar="DIR", help="reuse the output of identical runs, cached in DIR")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024), metavar="MB",
+                        help=f"evict the least recently used cache entries beyond this size (default: {DEFAULT_CACHE_SIZE // (1024 * 1024)})")
+    parser.add_argument("--compile", metavar="FILE",
+                        help="compile the workload file into a binary workload at FILE, which loads without parsing, instead of simulating it")
+    args = parser.parse_args(argv)
+
+    if args.compile:
+        if len(args.input_files) != 1:
+            parser.error("--compile takes exactly one workload file")
+        compile_workload(args.input_files[0], args.compile)
+        return
+
+    if args.resume and args.input_files:
+        parser.error("--resume carries on with a saved run, so it takes no workload files")
+    input_files = args.input_files or ([] if args.resume else ["set1.txt", "set2.txt"])
+    if args.checkpoint and len(input_files) > 1:
+        parser.error("--checkpoint saves a single run; give one workload file")
+    if args.cache and (args.resume or args.checkpoint or args.stop_at is not None or args.metrics or args.profile or args.trace_format != "text"):
+        parser.error("--cache only keeps the text output of complete runs; it cannot be used with --resume, --checkpoint, --stop-at, "
+                     "--metrics, --profile or other trace formats")
+
+    scheduler = run_mlfq_scheduler if args.engine == "tick" else run_mlfq_scheduler_event_driven
+    if args.trace is not None:
+        trace_level = TRACE_LEVELS[args.trace]
+    else:
+        trace_level = TRACE_FULL if args.engine == "tick" else TRACE_SUMMARY
+    if trace_level == TRACE_FULL and args.engine == "event":
+        parser.error("--trace full needs the tick engine")
+
+    if args.trace_format == "text":
+        trace = TextTraceSink(trace_level)
+    elif args.trace_file is None:
+        parser.error(f"--trace-format {args.trace_format} needs --trace-file")
+    elif args.trace_format == "jsonl":
+        trace = JsonlTraceSink(args.trace_file, trace_level)
+    else:
+        trace = BinaryTraceSink(args.trace_file, trace_level)
+    trace.aggregate = args.summary == "aggregate"
+
+    metrics_file = open(args.metrics, "w") if args.metrics else None
+    try:
+        if args.resume:
+            mlfq = load_checkpoint(args.resume)
+            _instrument(mlfq, metrics_file is not None, args.profile)
+            trace.begin_run(mlfq, args.resume)
+            _run_until(mlfq, None, scheduler, trace, args.stop_at)
+            if args.checkpoint:
+                save_checkpoint(mlfq, args.checkpoint)
+            _report_instrumentation(mlfq, args.resume, metrics_file)
+        cache = ResultCache(args.cache, args.cache_size * 1024 * 1024) if args.cache else None
+        for idx, input_file in enumerate(input_files):
+            if cache is not None:
+                _run_input_file_cached(input_file, args.engine, scheduler, trace, separator=idx > 0, stream=args.stream, cache=cache)
+                continue
+            mlfq = _run_input_file(input_file, scheduler, trace, separator=idx > 0 and args.trace_format == "text",
+                                   stream=args.stream, until=args.stop_at, metrics=metrics_file is not None, profile=args.profile,
+                                   checkpoint=args.checkpoint)
+            _report_instrumentation(mlfq, input_file, metrics_file)
+    finally:
+        trace.close()
+        if metrics_file is not None:
+            metrics_file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,568 @@
+# Batch engine for the MLFQ simulator, for Monte Carlo studies over many small workloads.
+#
+# Runs many independent workloads with the same scheduler parameters at once. Their processes are packed
+# into NumPy arrays (one row per workload, one column per process) holding the remaining bursts, queue
+# levels, quantum and allotment counters and I/O finishing times, and every workload is advanced in
+# lockstep with vectorized operations. Each iteration moves each workload on by one ms of a context switch,
+# or by one full time step of mlfq.run_mlfq_scheduler() otherwise. The steps are done in the same order
+# as there (arrivals, I/O, running the head of the first non-empty level, switching), so the completion,
+# turn-around and waiting times are the same, quirks included. After a full time step, each workload
+# skips on to its own next scheduling event, as mlfq.run_mlfq_scheduler_event_driven() does, so long
+# bursts cost no more iterations than short ones.
+#
+# Each queued process has a priority, (level << 58) + its place in the level, so the head of the first
+# non-empty level is the process with the lowest priority in its row. The RR and FCFS levels are FIFO
+# queues: a process's place in them is a per-workload counter that goes up every time a process is
+# queued (arrivals first, then processes back from I/O in the order they started it, then the process
+# that just ran). The SJF level is ordered by (remaining CPU time, processID), as ShortestJobFirstQueue is.
+#
+# Workloads the scalar engines cannot finish are flagged in "error" instead. These are workloads whose
+# scheduler stalls for good (the event-driven engine raises RuntimeError there, and the tick engine never
+# returns), and workloads where no process arrives at time 0.
+#
+# NumPy is only needed for this module:
+#   python mlfq_batch.py --count 10000 --processes 6 --check 100
+#   python mlfq_batch.py set1.txt set1_scftest.txt
+
+import argparse
+import csv
+import sys
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # The rest of the simulator does not need NumPy.
+    np = None
+
+import mlfq
+import mlfq_sweep
+import mlfq_workload
+
+# Process states
+_NOT_ARRIVED = 0
+_QUEUED = 1
+_DOING_IO = 2
+_DONE = 3
+_INACTIVE = 4  # Dropped arrivals (see mlfq._admit_arrivals()), and the padding of shorter workloads.
+
+_LEVEL_SHIFT = 58
+_NEVER = 2 ** 63 - 1  # Priority of processes that are not queued, and time of events that will not happen.
+
+BATCH_RESULT_KEYS = ["turnaround", "waiting", "completion", "processes", "average_turnaround", "average_waiting",
+                     "makespan", "total_context_switch_time", "error"]
+
+
+class BatchMLFQ:
+    def __init__(self, process_lists, rr_allotment, fcfs_allotment, context_switch_time, rr_time_quantum=mlfq.RR_TIME_QUANTUM):
+        if np is None:
+            raise ImportError("The batch engine needs NumPy (pip install numpy)")
+        self.rrTimeQuantum = rr_time_quantum
+        self.rrTimeAllotment = rr_allotment
+        self.fcfsTimeAllotment = fcfs_allotment
+        self.contextSwitch = context_switch_time
+
+        all_processes = [process for process_list in process_lists for process in process_list]
+        arrival_times = [process.arrivalTime for process in all_processes]
+        process_ids = [process.processID for process in all_processes]
+        burst_counts = [process.burstEnd - process.burstStart for process in all_processes]
+        burst_values = array("q")
+        for process in all_processes:
+            burst_values.extend(process.bursts[process.burstStart:process.burstEnd])
+
+        num_workloads = len(process_lists)
+        self.processes = np.array([len(process_list) for process_list in process_lists], np.int64)
+        width = max(int(self.processes.max(initial=0)), 1)
+        burst_counts = np.array(burst_counts, np.int64)
+        depth = max(int(burst_counts.max(initial=0)), 1)
+
+        # Per process: one row per workload, in the order of its process list.
+        rows = np.repeat(np.arange(num_workloads), self.processes)
+        columns = np.arange(len(rows)) - np.repeat(np.cumsum(self.processes) - self.processes, self.processes)
+        self.arrivalTime = np.full((num_workloads, width), _NEVER, np.int64)
+        self.arrivalTime[rows, columns] = arrival_times
+        self.processID = np.zeros((num_workloads, width), np.int64)
+        self.processID[rows, columns] = process_ids
+        self.burstCount = np.zeros((num_workloads, width), np.int64)
+        self.burstCount[rows, columns] = burst_counts
+        self.bursts = np.zeros((num_workloads, width, depth), np.int64)
+        positions = np.arange(len(burst_values)) - np.repeat(np.cumsum(burst_counts) - burst_counts, burst_counts)
+        self.bursts[np.repeat(rows, burst_counts), np.repeat(columns, burst_counts), positions] = np.frombuffer(burst_values, np.int64)
+        self.status = np.full((num_workloads, width), _INACTIVE, np.int8)
+        self.status[rows, columns] = _NOT_ARRIVED
+
+        self.level = np.full((num_workloads, width), mlfq.RR_HIGH_PRIORITY, np.int64)
+        self.queueKey = np.zeros((num_workloads, width), np.int64)
+        self.priority = np.full((num_workloads, width), _NEVER, np.int64)
+        self.burstIndex = np.zeros((num_workloads, width), np.int64)
+        self.remainingBurst = self.bursts[:, :, 0].copy()
+        self.remainingCpuTime = self.bursts[:, :, 0::2].sum(axis=2)
+        self.totalBurstTime = self.bursts.sum(axis=2)
+        self.usedTimeQuantum = np.zeros((num_workloads, width), np.int64)
+        self.usedTimeAllotment = np.zeros((num_workloads, width), np.int64)
+        self.ioFinishTick = np.full((num_workloads, width), _NEVER, np.int64)
+        self.ioSequence = np.zeros((num_workloads, width), np.int64)
+        self.completionTime = np.zeros((num_workloads, width), np.int64)
+        self.processCSTime = np.zeros((num_workloads, width), np.int64)
+
+        # Per workload
+        self.currentGlobalTime = np.zeros(num_workloads, np.int64)
+        self.nextArrival = np.zeros(num_workloads, np.int64)  # Column of the next process to arrive
+        self.ioClock = np.zeros(num_workloads, np.int64)
+        self.nextIOFinish = np.full(num_workloads, _NEVER, np.int64)  # I/O clock tick of the next I/O burst to finish
+        self.nextIOSequence = np.zeros(num_workloads, np.int64)
+        self.nextQueueKey = np.ones(num_workloads, np.int64)
+        self.queuedProcesses = np.zeros(num_workloads, np.int64)
+        self.recentRunningProcess = np.zeros(num_workloads, np.int64)  # processID, 0 for none
+        self.currentRunningProcess = np.full(num_workloads, -1, np.int64)  # Column, -1 for none
+        self.lastDispatchedProcess = np.full(num_workloads, -1, np.int64)  # Column of the last head that ran, -1 for none
+        self.switchRemaining = np.zeros(num_workloads, np.int64)  # ms left of the context switch in progress
+        self.switchTarget = np.full(num_workloads, -1, np.int64)  # Column of the process being switched in
+        self.totalCSTime = np.zeros(num_workloads, np.int64)
+        self.finished = np.zeros(num_workloads, bool)
+        self.error = np.zeros(num_workloads, bool)
+        self.workload = np.arange(num_workloads)  # Index of each row among the workloads given
+
+        self.sjfKeyScale = int(self.processID.max(initial=0)) + 1
+
+    def keep_rows(self, rows):
+        # Drops the rows of finished workloads.
+        num_rows = len(self.workload)
+        for name, value in list(vars(self).items()):
+            if isinstance(value, np.ndarray) and value.shape[:1] == (num_rows,):
+                setattr(self, name, value[rows])
+
+
+def _cells(batch: BatchMLFQ, rows, columns):
+    # Indices of these processes in the flattened per-process arrays (see _flat()). Picking them out of a
+    # flattened array is several times faster than indexing it with rows and columns.
+    return rows * batch.status.shape[1] + columns
+
+
+def _flat(array):
+    # A flat view of a per-process array; they are all contiguous, also after keep_rows().
+    return array.reshape(-1)
+
+
+def _update_priority(batch: BatchMLFQ, cells):
+    # Call after changing the state, level, place or remaining CPU time of these processes.
+    level = _flat(batch.level)[cells]
+    key = np.where(level == mlfq.SJF_LOW_PRIORITY,
+                   _flat(batch.remainingCpuTime)[cells] * batch.sjfKeyScale + _flat(batch.processID)[cells],
+                   _flat(batch.queueKey)[cells])
+    _flat(batch.priority)[cells] = np.where(_flat(batch.status)[cells] == _QUEUED, (level << _LEVEL_SHIFT) + key, _NEVER)
+
+
+def _admit_arrivals(batch: BatchMLFQ, stepping):
+    # Every process due by now has arrived; the ones that were due earlier are passed by.
+    width = batch.arrivalTime.shape[1]
+    next_arrival = _flat(batch.arrivalTime)[_cells(batch, np.arange(len(batch.workload)), np.minimum(batch.nextArrival, width - 1))]
+    due_rows = (stepping & (batch.nextArrival < batch.processes) & (next_arrival <= batch.currentGlobalTime)).nonzero()[0]
+    if not len(due_rows):
+        return
+
+    arrival_time = batch.arrivalTime[due_rows]
+    now = batch.currentGlobalTime[due_rows, None]
+    status = batch.status[due_rows]
+    not_arrived = status == _NOT_ARRIVED
+    arriving = not_arrived & (arrival_time == now)
+    status[not_arrived & (arrival_time < now)] = _INACTIVE
+    status[arriving] = _QUEUED
+    batch.status[due_rows] = status
+    batch.nextArrival[due_rows] = (arrival_time <= now).sum(axis=1)
+
+    arriving_rows, columns = arriving.nonzero()
+    rows = due_rows[arriving_rows]
+    cells = _cells(batch, rows, columns)
+    _flat(batch.queueKey)[cells] = batch.nextQueueKey[rows] + np.cumsum(arriving, axis=1)[arriving_rows, columns] - 1
+    _update_priority(batch, cells)
+    count = arriving.sum(axis=1)
+    batch.nextQueueKey[due_rows] += count
+    batch.queuedProcesses[due_rows] += count
+
+
+def _advance_io(batch: BatchMLFQ, advancing, stepping):
+    # One ms of I/O for the advancing rows. A process that finishes its last burst is done; in a full
+    # time step (but not during a context switch), every process that finished is stamped as well.
+    batch.ioClock += advancing
+    due_rows = (advancing & (batch.nextIOFinish <= batch.ioClock)).nonzero()[0]
+    if not len(due_rows):
+        return
+
+    finishing = batch.ioFinishTick[due_rows] == batch.ioClock[due_rows, None]
+    finishing_rows, columns = finishing.nonzero()
+    rows = due_rows[finishing_rows]
+    cells = _cells(batch, rows, columns)
+    _flat(batch.ioFinishTick)[cells] = _NEVER
+    batch.nextIOFinish[due_rows] = batch.ioFinishTick[due_rows].min(axis=1)
+    burst_index = _flat(batch.burstIndex)[cells] + 1
+    _flat(batch.burstIndex)[cells] = burst_index
+    more = burst_index < _flat(batch.burstCount)[cells]
+
+    requeued_rows, requeued_cells = rows[more], cells[more]
+    _flat(batch.remainingBurst)[requeued_cells] = _flat(batch.bursts)[requeued_cells * batch.bursts.shape[2] + burst_index[more]]
+    _flat(batch.status)[requeued_cells] = _QUEUED
+    # Queued in the order they started their I/O: ioSequence stays below nextIOSequence.
+    _flat(batch.queueKey)[requeued_cells] = batch.nextQueueKey[requeued_rows] + _flat(batch.ioSequence)[requeued_cells]
+    _update_priority(batch, requeued_cells)
+    batch.nextQueueKey[due_rows] += batch.nextIOSequence[due_rows]
+    np.add.at(batch.queuedProcesses, requeued_rows, 1)
+
+    done_cells = cells[~more]
+    _flat(batch.status)[done_cells] = _DONE
+    _flat(batch.level)[done_cells] = mlfq.NULL_QUEUE_PRIORITY
+    stamped = ~more | stepping[rows]
+    _flat(batch.completionTime)[cells[stamped]] = batch.currentGlobalTime[rows[stamped]]
+    _flat(batch.processCSTime)[cells[stamped]] = batch.totalCSTime[rows[stamped]]
+
+
+def _run_heads(batch: BatchMLFQ, rows):
+    # Runs the head of the first non-empty level of each of these rows for 1 ms. Returns the rows that
+    # have to switch to another process with the column of that process, and the rows that stalled.
+    priority = batch.priority[rows]
+    head = priority.argmin(axis=1)
+    cells = _cells(batch, rows, head)
+    head_level = _flat(batch.level)[cells]
+
+    # A process running at a lower level than the head holds the CPU (see mlfq._run_time_step()).
+    current = batch.currentRunningProcess[rows]
+    stalled = (current >= 0) & (_flat(batch.level)[_cells(batch, rows, np.maximum(current, 0))] > head_level)
+    if stalled.any():
+        runnable = ~stalled
+        stalled_rows = rows[stalled]
+        rows, head, cells, head_level, priority = rows[runnable], head[runnable], cells[runnable], head_level[runnable], priority[runnable]
+    else:
+        stalled_rows = rows[:0]
+
+    batch.lastDispatchedProcess[rows] = head
+    remaining_burst = _flat(batch.remainingBurst)[cells] - 1
+    _flat(batch.remainingBurst)[cells] = remaining_burst
+    _flat(batch.remainingCpuTime)[cells] -= 1
+    used_quantum = _flat(batch.usedTimeQuantum)[cells] + 1
+    _flat(batch.usedTimeQuantum)[cells] = used_quantum
+    used_allotment = _flat(batch.usedTimeAllotment)[cells] + 1
+    _flat(batch.usedTimeAllotment)[cells] = used_allotment
+
+    burst_done = remaining_burst == 0
+    if burst_done.any():
+        burst_rows, burst_cells = rows[burst_done], cells[burst_done]
+        burst_index = _flat(batch.burstIndex)[burst_cells] + 1
+        _flat(batch.burstIndex)[burst_cells] = burst_index
+        more = burst_index < _flat(batch.burstCount)[burst_cells]
+        batch.queuedProcesses[burst_rows] -= 1
+
+        io_rows, io_cells = burst_rows[more], burst_cells[more]
+        io_burst = _flat(batch.bursts)[io_cells * batch.bursts.shape[2] + burst_index[more]]
+        _flat(batch.remainingBurst)[io_cells] = io_burst
+        _flat(batch.usedTimeQuantum)[io_cells] = 0
+        _flat(batch.usedTimeAllotment)[io_cells] = 0
+        _flat(batch.status)[io_cells] = _DOING_IO
+        finish = batch.ioClock[io_rows] + io_burst
+        _flat(batch.ioFinishTick)[io_cells] = finish
+        batch.nextIOFinish[io_rows] = np.minimum(batch.nextIOFinish[io_rows], finish)
+        _flat(batch.ioSequence)[io_cells] = batch.nextIOSequence[io_rows]
+        batch.nextIOSequence[io_rows] += 1
+
+        done_rows, done_cells = burst_rows[~more], burst_cells[~more]
+        _flat(batch.status)[done_cells] = _DONE
+        _flat(batch.level)[done_cells] = mlfq.NULL_QUEUE_PRIORITY
+        _flat(batch.completionTime)[done_cells] = batch.currentGlobalTime[done_rows]
+        _flat(batch.processCSTime)[done_cells] = batch.totalCSTime[done_rows]
+
+    in_rr = ~burst_done & (head_level == mlfq.RR_HIGH_PRIORITY)
+    demoted_rr = in_rr & (used_allotment == batch.rrTimeAllotment)
+    expired = in_rr & ~demoted_rr & (used_quantum == batch.rrTimeQuantum)
+    demoted_fcfs = ~burst_done & (head_level == mlfq.FCFS_MEDIUM_PRIORITY) & (used_allotment == batch.fcfsTimeAllotment)
+    demoted = demoted_rr | demoted_fcfs
+    if demoted.any() or expired.any():
+        _flat(batch.level)[cells[demoted]] += 1
+        _flat(batch.usedTimeQuantum)[cells[demoted | expired]] = 0
+        _flat(batch.usedTimeAllotment)[cells[demoted]] = 0
+        # Processes moving to the back of the RR level or to the FCFS level join it last.
+        requeued = demoted_rr | expired
+        _flat(batch.queueKey)[cells[requeued]] = batch.nextQueueKey[rows[requeued]]
+        batch.nextQueueKey[rows[requeued]] += 1
+    _update_priority(batch, cells)
+
+    # The process to switch to is the new head of the level that ran, except that an SJF process that keeps
+    # running is moved behind the runner-up, if there is one.
+    index = np.arange(len(rows))
+    priority[index, head] = _flat(batch.priority)[cells]
+    rotated = ~burst_done & (head_level == mlfq.SJF_LOW_PRIORITY)
+    priority[index[rotated], head[rotated]] = _NEVER
+    next_process = priority.argmin(axis=1)
+    same_level = (priority[index, next_process] >> _LEVEL_SHIFT) == head_level
+    next_process = np.where(rotated & ~same_level, head, next_process)
+    has_next = same_level | rotated
+
+    switching = has_next & (batch.recentRunningProcess[rows] != _flat(batch.processID)[_cells(batch, rows, next_process)])
+    return rows[switching], next_process[switching], stalled_rows
+
+
+def _switch_to(batch: BatchMLFQ, rows, columns):
+    batch.recentRunningProcess[rows] = _flat(batch.processID)[_cells(batch, rows, columns)]
+    batch.currentRunningProcess[rows] = columns
+
+
+def _batch_step(batch: BatchMLFQ):
+    # Moves every unfinished row on by one time step, or by one ms of the context switch it is in.
+    # Returns whether each row finished its time step, and the rows that stalled.
+    switching = batch.switchRemaining > 0
+    stepping = ~switching & ~batch.finished
+
+    _admit_arrivals(batch, stepping)
+    _advance_io(batch, switching | (stepping & (batch.currentGlobalTime > 0)), stepping)
+
+    # One ms of a context switch
+    step_done = stepping
+    if switching.any():
+        batch.currentGlobalTime += switching
+        batch.switchRemaining -= switching
+        switched = switching & (batch.switchRemaining == 0)
+        batch.totalCSTime += switched * batch.contextSwitch
+        _switch_to(batch, switched.nonzero()[0], batch.switchTarget[switched])
+        step_done = stepping | switched
+
+    # At time 0, the first arrival is taken as the running process.
+    starting = stepping & (batch.currentGlobalTime == 0)
+    if starting.any():
+        rows = starting.nonzero()[0]
+        batch.error[rows[batch.queuedProcesses[rows] == 0]] = True
+        rows = rows[batch.queuedProcesses[rows] > 0]
+        batch.recentRunningProcess[rows] = batch.processID[rows, batch.priority[rows].argmin(axis=1)]
+
+    running = (stepping & (batch.currentGlobalTime > 0) & (batch.queuedProcesses > 0)).nonzero()[0]
+    rows, columns, stalled_rows = _run_heads(batch, running)
+    if batch.contextSwitch > 0:
+        batch.switchRemaining[rows] = batch.contextSwitch
+        batch.switchTarget[rows] = columns
+        step_done = step_done.copy()
+        step_done[rows] = False
+    else:
+        _switch_to(batch, rows, columns)
+
+    return step_done, stalled_rows
+
+
+def _steps_until_next_event(batch: BatchMLFQ, rows):
+    # mlfq._steps_until_next_event() for each of these rows, which have just finished a time step and
+    # still have queued processes. Returns the number of steps, _NEVER where nothing will ever happen,
+    # the cell of the head of each row (see _cells()) and whether the head runs.
+    width = batch.arrivalTime.shape[1]
+    steps = np.full(len(rows), _NEVER, np.int64)
+    pending = batch.nextArrival[rows] < batch.processes[rows]
+    next_arrival = _flat(batch.arrivalTime)[_cells(batch, rows, np.minimum(batch.nextArrival[rows], width - 1))]
+    steps[pending] = np.maximum(next_arrival[pending] - batch.currentGlobalTime[rows[pending]], 0)
+    doing_io = batch.nextIOFinish[rows] != _NEVER
+    steps[doing_io] = np.minimum(steps[doing_io], batch.nextIOFinish[rows[doing_io]] - batch.ioClock[rows[doing_io]] - 1)
+
+    priority = batch.priority[rows]
+    head = priority.argmin(axis=1)
+    cells = _cells(batch, rows, head)
+    head_level = _flat(batch.level)[cells]
+    current = batch.currentRunningProcess[rows]
+    running = ~((current >= 0) & (_flat(batch.level)[_cells(batch, rows, np.maximum(current, 0))] > head_level))
+
+    # An SJF process is rotated to the back after every time step, so the context switch check looks at
+    # the runner-up instead of the process itself.
+    next_head = head.copy()
+    sjf = (head_level == mlfq.SJF_LOW_PRIORITY).nonzero()[0]
+    if len(sjf):
+        sjf_priority = priority[sjf]
+        sjf_priority[np.arange(len(sjf)), head[sjf]] = _NEVER
+        runner_up = sjf_priority.argmin(axis=1)
+        queued = sjf_priority[np.arange(len(sjf)), runner_up] != _NEVER
+        next_head[sjf] = np.where(queued, runner_up, head[sjf])
+
+    remaining_burst = _flat(batch.remainingBurst)[cells]
+    used_quantum = _flat(batch.usedTimeQuantum)[cells]
+    used_allotment = _flat(batch.usedTimeAllotment)[cells]
+    dispatched = ((remaining_burst > 0) & (batch.recentRunningProcess[rows] == _flat(batch.processID)[_cells(batch, rows, next_head)])
+                  & (batch.lastDispatchedProcess[rows] == head))
+    limit = remaining_burst - 1
+    in_rr = head_level == mlfq.RR_HIGH_PRIORITY
+    in_fcfs = head_level == mlfq.FCFS_MEDIUM_PRIORITY
+    limit = np.where(in_rr & (used_allotment < batch.rrTimeAllotment),
+                     np.minimum(limit, batch.rrTimeAllotment - used_allotment - 1), limit)
+    limit = np.where(in_rr & (used_quantum < batch.rrTimeQuantum),
+                     np.minimum(limit, batch.rrTimeQuantum - used_quantum - 1), limit)
+    limit = np.where(in_fcfs & (used_allotment < batch.fcfsTimeAllotment),
+                     np.minimum(limit, batch.fcfsTimeAllotment - used_allotment - 1), limit)
+    steps = np.where(running, np.where(dispatched, np.minimum(steps, limit), 0), steps)
+    return steps, cells, running
+
+
+def _skip_time_steps(batch: BatchMLFQ, rows):
+    # Moves each of these rows on to its next scheduling event at once, as the event-driven engine does.
+    steps, cells, running = _steps_until_next_event(batch, rows)
+    skipping = (steps > 0) & (steps != _NEVER)
+    rows, steps, cells, running = rows[skipping], steps[skipping], cells[skipping], running[skipping]
+    batch.ioClock[rows] += steps  # No I/O burst finishes within the skipped steps.
+    batch.currentGlobalTime[rows] += steps
+
+    steps, cells = steps[running], cells[running]
+    _flat(batch.remainingBurst)[cells] -= steps
+    _flat(batch.remainingCpuTime)[cells] -= steps
+    _flat(batch.usedTimeQuantum)[cells] += steps
+    _flat(batch.usedTimeAllotment)[cells] += steps
+    _update_priority(batch, cells)
+
+
+def run_mlfq_batch(process_lists, rr_allotment, fcfs_allotment, context_switch_time, rr_time_quantum=mlfq.RR_TIME_QUANTUM):
+    # Each process list has to be ordered by arrival time, as for mlfq.run_mlfq_scheduler(), and its
+    # processes are not modified. Returns a dictionary of NumPy arrays (see BATCH_RESULT_KEYS): the
+    # per-process times have a row per workload and a column per process, in process list order, and
+    # are 0 past the end of shorter workloads; the rest have one value per workload, like the figures
+    # of mlfq.summarize_simulation().
+    batch = BatchMLFQ(process_lists, rr_allotment, fcfs_allotment, context_switch_time, rr_time_quantum)
+    num_workloads = len(process_lists)
+    width = batch.status.shape[1]
+    arrival_time, total_burst_time, num_processes = batch.arrivalTime, batch.totalBurstTime, batch.processes  # Before rows are dropped
+    completion = np.zeros((num_workloads, width), np.int64)
+    process_cs_time = np.zeros((num_workloads, width), np.int64)
+    total_cs_time = np.zeros(num_workloads, np.int64)
+    error = np.zeros(num_workloads, bool)
+
+    while len(batch.workload):
+        step_done, stalled_rows = _batch_step(batch)
+        batch.currentGlobalTime += step_done
+
+        # A stalled run can only go on if a process is still to arrive or doing I/O (see mlfq._steps_until_next_event()).
+        stuck = (batch.nextArrival[stalled_rows] >= batch.processes[stalled_rows]) & (batch.nextIOFinish[stalled_rows] == _NEVER)
+        batch.error[stalled_rows[stuck]] = True
+        _skip_time_steps(batch, (step_done & ~batch.finished & ~batch.error & (batch.queuedProcesses > 0)).nonzero()[0])
+        ended = ~batch.finished & (batch.error | (step_done & (batch.queuedProcesses == 0)))
+        if ended.any():
+            workloads = batch.workload[ended]
+            completion[workloads] = batch.completionTime[ended]
+            process_cs_time[workloads] = batch.processCSTime[ended]
+            total_cs_time[workloads] = batch.totalCSTime[ended]
+            error[workloads] = batch.error[ended]
+            batch.finished |= ended
+            if 4 * batch.finished.sum() >= len(batch.workload):
+                batch.keep_rows(~batch.finished)
+
+    real = np.arange(width)[None, :] < num_processes[:, None]
+    turnaround = np.where(real, completion - arrival_time, 0)
+    waiting = np.where(real, completion - total_burst_time - process_cs_time, 0)  # As mlfq._compute_turnaround_and_waiting() has it
+    processes = np.maximum(num_processes, 1)
+    return {
+        "turnaround": turnaround,
+        "waiting": waiting,
+        "completion": np.where(real, completion, 0),
+        "processes": num_processes,
+        "average_turnaround": turnaround.sum(axis=1) / processes,
+        "average_waiting": waiting.sum(axis=1) / processes,
+        "makespan": completion.max(axis=1, initial=0),
+        "total_context_switch_time": total_cs_time,
+        "error": error,
+    }
+
+
+BATCH_COLUMNS = ["workload", "processes", "average_turnaround", "average_waiting", "makespan", "total_context_switch_time", "error"]
+
+
+def _result_rows(names, results):
+    return [{
+        "workload": name,
+        "processes": int(results["processes"][idx]),
+        "average_turnaround": float(results["average_turnaround"][idx]),
+        "average_waiting": float(results["average_waiting"][idx]),
+        "makespan": int(results["makespan"][idx]),
+        "total_context_switch_time": int(results["total_context_switch_time"][idx]),
+        "error": bool(results["error"][idx]),
+    } for idx, name in enumerate(names)]
+
+
+def check_against_event_engine(process_lists, results, rr_allotment, fcfs_allotment, context_switch_time, rr_time_quantum):
+    # Runs the workloads with the event-driven engine and returns the indices of the ones whose
+    # completion, turn-around and waiting times (or failure) differ from the batch results.
+    mismatches = []
+    for idx, process_list in enumerate(process_lists):
+        MLFQ = mlfq.MLFQ(rr_allotment, fcfs_allotment, context_switch_time, rr_time_quantum)
+        try:
+            mlfq.run_mlfq_scheduler_event_driven(MLFQ, process_list, mlfq.TraceSink(mlfq.TRACE_OFF))
+        except (RuntimeError, IndexError):
+            if not results["error"][idx]:
+                mismatches.append(idx)
+            continue
+
+        summary = mlfq.summarize_simulation(MLFQ, process_list)
+        expected = [(p.completionTime, p.turnaroundTime, p.waitingTime) for p in process_list]
+        count = len(process_list)
+        got = list(zip(results["completion"][idx][:count].tolist(), results["turnaround"][idx][:count].tolist(),
+                       results["waiting"][idx][:count].tolist()))
+        if results["error"][idx] or expected != got or summary["total_context_switch_time"] != results["total_context_switch_time"][idx]:
+            mismatches.append(idx)
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run many MLFQ workloads at once with the vectorized batch engine (needs NumPy).")
+    parser.add_argument("input_files", nargs="*", help="workload files in the set1.txt format (or compiled), all with the same parameters")
+    parser.add_argument("--count", type=int, default=1000, help="without input files, the number of workloads to generate (default: 1000)")
+    parser.add_argument("--processes", type=int, default=6, help="number of processes in each generated workload (default: 6)")
+    mlfq_workload.add_workload_arguments(parser)
+    parser.set_defaults(arrivals="batch")  # As in mlfq_bench.py: other arrivals often find every queue empty early on.
+    parser.add_argument("--quantum", type=int, default=mlfq.RR_TIME_QUANTUM, help=f"RR time quantum (default: {mlfq.RR_TIME_QUANTUM})")
+    parser.add_argument("--check", type=int, default=0, metavar="N", help="compare the first N workloads with the event-driven engine")
+    parser.add_argument("--csv", help="write one row per workload to this CSV file")
+    args = parser.parse_args(argv)
+    if np is None:
+        parser.error("the batch engine needs NumPy (pip install numpy)")
+
+    if args.input_files:
+        names = args.input_files
+        parsed = []
+        for input_file in args.input_files:
+            if mlfq.is_compiled_workload(input_file):
+                parsed.append(mlfq.CompiledWorkload(input_file).parse())
+                continue
+            with open(input_file, "r") as file:
+                parsed.append(mlfq.parse_input(file.read()))
+        rr_allotment, fcfs_allotment, context_switch_time = parsed[0][1:4]
+        if any(header[1:4] != (rr_allotment, fcfs_allotment, context_switch_time) for header in parsed):
+            parser.error("the input files must have the same RR and FCFS time allotments and context switch time")
+        process_lists = [header[4] for header in parsed]
+    else:
+        # Seeds --seed, --seed + 1, ... give the workloads.
+        options = mlfq_workload.workload_options(args)
+        rr_allotment, fcfs_allotment, context_switch_time = args.rr_allotment, args.fcfs_allotment, args.context_switch
+        names = list(range(args.seed, args.seed + args.count))
+        process_lists = [mlfq.parse_input(mlfq_workload.workload_text(args.processes, **dict(options, seed=seed)))[4]
+                         for seed in names]
+
+    start = time.perf_counter()
+    results = run_mlfq_batch(process_lists, rr_allotment, fcfs_allotment, context_switch_time, args.quantum)
+    elapsed = time.perf_counter() - start
+    rows = _result_rows(names, results)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=BATCH_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    elif args.input_files:
+        mlfq_sweep.write_table(rows, sys.stdout, BATCH_COLUMNS)
+
+    finished = ~results["error"]
+    print(f"{len(rows)} workloads in {round(elapsed, 3)} s ({round(len(rows) / max(elapsed, 1e-9))} per second), "
+          f"{len(rows) - int(finished.sum())} could not finish")
+    if finished.any():
+        for name in ("average_turnaround", "average_waiting", "makespan"):
+            values = results[name][finished]
+            low, median, high = np.percentile(values, [5, 50, 95])
+            print(f"{name}: mean {round(float(values.mean()), 4)}, 5% {round(float(low), 4)}, "
+                  f"median {round(float(median), 4)}, 95% {round(float(high), 4)}")
+
+    if args.check:
+        mismatches = check_against_event_engine(process_lists[:args.check], results, rr_allotment, fcfs_allotment,
+                                                context_switch_time, args.quantum)
+        print(f"Checked {min(args.check, len(rows))} workloads against the event-driven engine: {len(mismatches)} differ"
+              + (f" ({', '.join(str(names[idx]) for idx in mismatches[:10])})" if mismatches else ""))
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
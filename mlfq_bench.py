@@ -0,0 +1,124 @@
+# Scaling benchmark for the MLFQ simulator.
+#
+# Generates a seeded workload (see mlfq_workload.py) for every process count and simulates it with each
+# engine, with tracing off. Every run happens in a fresh worker process, so that its peak RSS only covers
+# that run (the interpreter itself included). For each run it reports how many ms were simulated per
+# second of wall time and how many scheduling decisions (times the CPU was given to a different process)
+# were made per second. Generating and parsing the workload are not timed.
+#
+# The scheduler ends a run as soon as its three queues are empty, so workloads with idle gaps between
+# arrivals stop early; the benchmark therefore defaults to batch arrivals. The "done" column counts the
+# processes that ran to completion. A run whose scheduler stalls is reported as an error; the tick engine
+# would loop forever on the same workload, so it is skipped whenever the event engine stalled.
+#
+# Example:
+#   python mlfq_bench.py --sizes 10,100,1000,10000 --engines event --csv baseline.csv
+
+import argparse
+import csv
+import multiprocessing
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+import mlfq
+import mlfq_sweep
+import mlfq_workload
+
+BENCH_SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+BENCH_ENGINES = ["event", "tick"]
+BENCH_COLUMNS = ["engine", "processes", "done", "simulated_ms", "seconds", "simulated_ms_per_second",
+                 "decisions", "decisions_per_second", "peak_rss_mb", "error"]
+
+# The tick engine takes time in proportion to the simulated time, so by default it is only run on the
+# smaller workloads.
+MAX_TICK_PROCESSES = 100000
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_benchmark(engine: str, num_processes: int, options: dict):
+    num_processes, rr_allotment, fcfs_allotment, context_switch_time, process_list = mlfq.parse_input(
+        mlfq_workload.workload_text(num_processes, **options))
+    scheduler = mlfq.MLFQ(rr_allotment, fcfs_allotment, context_switch_time)
+    run = mlfq.run_mlfq_scheduler_event_driven if engine == "event" else mlfq.run_mlfq_scheduler
+
+    row = {"engine": engine, "processes": num_processes}
+    start = time.perf_counter()
+    try:
+        run(scheduler, process_list, mlfq.TraceSink(mlfq.TRACE_OFF))
+    except RuntimeError as error:
+        row["error"] = str(error)
+    seconds = time.perf_counter() - start
+
+    row.update(done=sum(1 for p in process_list if p.currentQueue == mlfq.NULL_QUEUE_PRIORITY),
+               simulated_ms=scheduler.currentGlobalTime, seconds=seconds,
+               simulated_ms_per_second=round(scheduler.currentGlobalTime / seconds),
+               decisions=scheduler.dispatchCount, decisions_per_second=round(scheduler.dispatchCount / seconds),
+               peak_rss_mb=_peak_rss_mb())
+    return row
+
+
+def benchmark(sizes=BENCH_SIZES, engines=BENCH_ENGINES, max_tick_processes=MAX_TICK_PROCESSES, **options):
+    # options are passed on to mlfq_workload.generate_workload(). Returns one row (a dictionary) per run.
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for num_processes in sizes:
+        stalled = False
+        for engine in sorted(engines, key=lambda engine: engine != "event"):
+            if engine == "tick" and num_processes > max_tick_processes:
+                continue
+            if engine == "tick" and stalled:
+                rows.append({"engine": engine, "processes": num_processes, "error": "skipped: the event engine stalled"})
+                continue
+
+            with context.Pool(1) as pool:
+                row = pool.apply(_run_benchmark, (engine, num_processes, options))
+            stalled = stalled or "error" in row
+            rows.append(row)
+    return rows
+
+
+def _parse_list(text: str):
+    return [part.strip() for part in text.split(",") if part.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how the MLFQ simulator scales with the number of processes.")
+    parser.add_argument("--sizes", type=lambda text: [int(float(size)) for size in _parse_list(text)], default=BENCH_SIZES,
+                        help="comma-separated process counts, e.g. 10,1e3,1e5 (default: 10 to 10^6 in powers of ten)")
+    parser.add_argument("--engines", type=_parse_list, default=BENCH_ENGINES, help="comma-separated engines to run (default: event,tick)")
+    parser.add_argument("--max-tick-processes", type=int, default=MAX_TICK_PROCESSES,
+                        help=f"largest workload to run with the tick engine (default: {MAX_TICK_PROCESSES})")
+    parser.add_argument("--csv", help="write the results to this CSV file instead of printing a table")
+    mlfq_workload.add_workload_arguments(parser)
+    parser.set_defaults(arrivals="batch")
+    args = parser.parse_args(argv)
+
+    unknown_engines = set(args.engines) - set(BENCH_ENGINES)
+    if unknown_engines:
+        parser.error(f"unknown engine(s): {', '.join(sorted(unknown_engines))}")
+
+    rows = benchmark(args.sizes, args.engines, args.max_tick_processes, **mlfq_workload.workload_options(args))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=BENCH_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        mlfq_sweep.write_table(rows, sys.stdout, BENCH_COLUMNS)
+
+
+if __name__ == "__main__":
+    main()
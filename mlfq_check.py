@@ -0,0 +1,202 @@
+# Equivalence checks for the MLFQ simulator's engines and modes.
+#
+# Draws small random workloads from mlfq_workload.py (the scheduler parameters, burst lengths, I/O,
+# arrivals and RR time quantum all come from the seed) and checks that the ways of running them agree:
+#   engines     the tick and event-driven engines give the same per-process results, the same
+#               --trace events output and the same --metrics counters and histograms
+#   checkpoint  a run paused at a random time, checkpointed, restored and finished with either engine,
+#               read all at once or streamed, prints the same summary as an uninterrupted run
+#   cli         the same through mlfq.main(): --stream --stop-at --checkpoint, then --resume
+#   batch       mlfq_batch.run_mlfq_batch() agrees with the event-driven engine (needs NumPy), for
+#               groups of workloads run with the parameters of the first one in the group
+#
+# Workloads whose scheduler stalls are left out of the other checks, since the tick engine would never
+# return on them. Prints a line per check and exits with status 1 if any workload differs.
+#
+# Example (rerun after changing the scheduler):
+#   python mlfq_check.py --count 500 --seed 0
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+
+import mlfq
+import mlfq_batch
+import mlfq_workload
+
+ENGINES = {"tick": mlfq.run_mlfq_scheduler, "event": mlfq.run_mlfq_scheduler_event_driven}
+BATCH_GROUP_SIZE = 50
+
+
+def random_workload(seed: int):
+    # Returns the text of a workload and an RR time quantum for it.
+    rng = random.Random(seed)
+    options = dict(seed=seed, rr_allotment=rng.randint(1, 12), fcfs_allotment=rng.randint(1, 12),
+                   context_switch_time=rng.choice([0, 0, 1, 2, 3]), cpu_mean=rng.choice([2, 5, 10, 30]),
+                   cpu_distribution=rng.choice(mlfq_workload.BURST_DISTRIBUTIONS), io_ratio=rng.choice([0, 0.25, 0.5]),
+                   max_cpu_bursts=rng.randint(1, 4), arrivals=rng.choice(mlfq_workload.ARRIVAL_PROCESSES),
+                   mean_interarrival=rng.choice([1, 3, 10]))
+    return mlfq_workload.workload_text(rng.randint(1, 12), **options), rng.randint(1, 6)
+
+
+def _results(process_list):
+    return [(p.processName, p.completionTime, p.turnaroundTime, p.waitingTime) for p in process_list]
+
+
+def _run(engine: str, text: str, quantum: int, trace_level: int, metrics: bool = False):
+    # Returns the scheduler, the results and what the run printed.
+    output = io.StringIO()
+    _, rr_allotment, fcfs_allotment, context_switch_time, process_list = mlfq.parse_input(text)
+    scheduler = mlfq.MLFQ(rr_allotment, fcfs_allotment, context_switch_time, quantum)
+    if metrics:
+        scheduler.metrics = mlfq.Metrics()
+    with contextlib.redirect_stdout(output):
+        ENGINES[engine](scheduler, process_list, mlfq.TextTraceSink(trace_level))
+    return scheduler, _results(process_list), output.getvalue()
+
+
+def _end_time(text: str, quantum: int):
+    # The time the event-driven engine finishes the workload at, or None if it stalls (the tick engine
+    # would never return then).
+    try:
+        scheduler, _, _ = _run("event", text, quantum, mlfq.TRACE_OFF)
+    except (RuntimeError, IndexError):
+        return None
+    return scheduler.currentGlobalTime
+
+
+# Each check below takes a workload, its RR time quantum and a random generator seeded like the workload,
+# and returns whether the runs agree, or None if the workload stalls.
+
+
+def check_engines(text: str, quantum: int, rng: random.Random):
+    if _end_time(text, quantum) is None:
+        return None
+    event, event_results, event_output = _run("event", text, quantum, mlfq.TRACE_EVENTS, metrics=True)
+    tick, tick_results, tick_output = _run("tick", text, quantum, mlfq.TRACE_EVENTS, metrics=True)
+    return (tick_results == event_results and tick_output == event_output
+            and tick.metrics.report(tick) == event.metrics.report(event))
+
+
+def check_checkpoint(text: str, quantum: int, rng: random.Random):
+    end_time = _end_time(text, quantum)
+    if end_time is None:
+        return None
+    _, _, expected = _run("event", text, quantum, mlfq.TRACE_SUMMARY)
+    until = rng.randint(0, end_time + 2)
+    first, second, stream = rng.choice(list(ENGINES)), rng.choice(list(ENGINES)), rng.random() < 0.5
+
+    output = io.StringIO()
+    _, rr_allotment, fcfs_allotment, context_switch_time, process_list = (
+        mlfq.read_input(io.StringIO(text)) if stream else mlfq.parse_input(text))
+    scheduler = mlfq.MLFQ(rr_allotment, fcfs_allotment, context_switch_time, quantum)
+    with contextlib.redirect_stdout(output):
+        if not ENGINES[first](scheduler, process_list, mlfq.TextTraceSink(mlfq.TRACE_SUMMARY), until=until):
+            restored = mlfq.restore_scheduler(mlfq.checkpoint_scheduler(scheduler))
+            ENGINES[second](restored, None, mlfq.TextTraceSink(mlfq.TRACE_SUMMARY))
+    return output.getvalue() == expected
+
+
+def _main_output(argv):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        mlfq.main(argv)
+    return output.getvalue()
+
+
+def check_cli(text: str, quantum: int, rng: random.Random):
+    end_time = _end_time(text, mlfq.RR_TIME_QUANTUM)  # mlfq.main() always uses the default RR time quantum.
+    if end_time is None:
+        return None
+    with tempfile.TemporaryDirectory() as directory:
+        workload_file = os.path.join(directory, "workload.txt")
+        checkpoint_file = os.path.join(directory, "workload.ckpt")
+        with open(workload_file, "w") as file:
+            file.write(text)
+        expected = _main_output(["--engine", "event", "--trace", "summary", workload_file])
+
+        until = rng.randint(0, end_time + 2)
+        first, second = rng.choice(list(ENGINES)), rng.choice(list(ENGINES))
+        paused = _main_output(["--engine", first, "--trace", "summary", "--stream", "--stop-at", str(until),
+                               "--checkpoint", checkpoint_file, workload_file])
+        resumed = _main_output(["--engine", second, "--trace", "summary", "--resume", checkpoint_file])
+    # A run that finishes before --stop-at prints its summary right away, and resuming it prints nothing more.
+    output = re.sub(r"^Paused at Time = \d+\n\n", "", paused) + resumed
+    return output.rstrip("\n") == expected.rstrip("\n")
+
+
+WORKLOAD_CHECKS = {"engines": check_engines, "checkpoint": check_checkpoint, "cli": check_cli}
+
+
+def check_batch(seeds):
+    # Returns the seeds whose batch results differ from the event-driven engine's.
+    mismatches = []
+    for start in range(0, len(seeds), BATCH_GROUP_SIZE):
+        group = seeds[start:start + BATCH_GROUP_SIZE]
+        workloads = [random_workload(seed) for seed in group]
+        _, rr_allotment, fcfs_allotment, context_switch_time, _ = mlfq.parse_input(workloads[0][0])
+        quantum = workloads[0][1]
+        process_lists = [mlfq.parse_input(text)[4] for text, _ in workloads]
+        results = mlfq_batch.run_mlfq_batch(process_lists, rr_allotment, fcfs_allotment, context_switch_time, quantum)
+        mismatches += [group[idx] for idx in mlfq_batch.check_against_event_engine(
+            process_lists, results, rr_allotment, fcfs_allotment, context_switch_time, quantum)]
+    return mismatches
+
+
+CHECKS = list(WORKLOAD_CHECKS) + ["batch"]
+
+
+def run_checks(seeds, checks=CHECKS):
+    # Returns {check: (workloads checked, seeds that differ)}; checks that cannot run are left out.
+    report = {}
+    for check in checks:
+        if check in WORKLOAD_CHECKS:
+            checked, mismatches = 0, []
+            for seed in seeds:
+                text, quantum = random_workload(seed)
+                same = WORKLOAD_CHECKS[check](text, quantum, random.Random(seed))
+                if same is not None:
+                    checked += 1
+                    if not same:
+                        mismatches.append(seed)
+            report[check] = (checked, mismatches)
+        elif check == "batch" and mlfq_batch.np is not None:
+            report[check] = (len(seeds), check_batch(seeds))
+    return report
+
+
+def _parse_list(text: str):
+    return [part.strip() for part in text.split(",") if part.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the MLFQ engines and run modes agree on seeded random workloads.")
+    parser.add_argument("--count", type=int, default=300, help="number of workloads (default: 300)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first workload; the others follow on (default: 0)")
+    parser.add_argument("--checks", type=_parse_list, default=CHECKS, help=f"comma-separated checks to run (default: {','.join(CHECKS)})")
+    args = parser.parse_args(argv)
+
+    unknown_checks = set(args.checks) - set(CHECKS)
+    if unknown_checks:
+        parser.error(f"unknown check(s): {', '.join(sorted(unknown_checks))}")
+
+    seeds = list(range(args.seed, args.seed + args.count))
+    report = run_checks(seeds, args.checks)
+    for check in args.checks:
+        if check not in report:
+            print(f"{check}: skipped (the batch engine needs NumPy)")
+            continue
+        checked, mismatches = report[check]
+        print(f"{check}: {checked} workloads checked, {len(mismatches)} differ"
+              + (f" (seeds {', '.join(str(seed) for seed in mismatches[:10])})" if mismatches else ""))
+    if any(mismatches for _, mismatches in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+# Multi-CPU simulation for the MLFQ scheduler.
+#
+# mlfq.py models a single CPU. Here k cores each have their own RR, FCFS and SJF levels (with the same
+# time quantum and allotments) and share the I/O devices:
+#   - an arriving process is placed on a core by the balancing policy ("round-robin" goes around the
+#     cores, "least-loaded" picks the core with the fewest queued processes), and goes back to the same
+#     core after each of its I/O bursts;
+#   - with work stealing on, a core that has nothing to run takes a waiting process from the core with
+#     the most queued processes, highest level first;
+#   - every ms, each core runs the first process of its highest non-empty level, and switching a core
+#     to a different process costs that core the context switch time.
+# The levels follow the usual MLFQ rules: a higher level preempts a lower one (the process that was
+# switched away from keeps its place, quantum and allotment usage), and a run lasts until every process
+# is done. One core therefore gives similar, but not identical, results to mlfq.run_mlfq_scheduler().
+#
+# Turn-around time is completion - arrival, and waiting time is the part of it a process spent neither
+# running, doing I/O nor being switched in.
+#
+# Example:
+#   python mlfq_multicore.py big.txt --cores 64 --balance least-loaded
+
+import argparse
+import contextlib
+import heapq
+import os
+from collections import deque
+
+from mlfq import (FCFS_MEDIUM_PRIORITY, NULL_QUEUE_PRIORITY, RR_HIGH_PRIORITY, RR_TIME_QUANTUM, SJF_LOW_PRIORITY,
+                  ArrivalStream, CompiledWorkload, is_compiled_workload, parse_input, read_input)
+
+BALANCE_POLICIES = ["round-robin", "least-loaded"]
+
+
+class Core:
+    def __init__(self, core_id: int):
+        self.coreID = core_id
+        self.roundRobinQueue = deque()
+        self.firstComeFirstServeQueue = deque()
+        self.shortestJobFirstQueue = []  # Heap of (remainingCpuTime, processID, process)
+        self.lastProcess = None  # The process the core ran (or switched to) most recently.
+        self.switchRemaining = 0  # ms left of the context switch in progress.
+        self.busyTime = 0
+        self.switchTime = 0
+        self.contextSwitches = 0
+        self.stolenProcesses = 0
+
+    def __len__(self):
+        return len(self.roundRobinQueue) + len(self.firstComeFirstServeQueue) + len(self.shortestJobFirstQueue)
+
+    def head(self):
+        # The process to run next, or None if the core has nothing to run.
+        if self.roundRobinQueue:
+            return self.roundRobinQueue[0]
+        if self.firstComeFirstServeQueue:
+            return self.firstComeFirstServeQueue[0]
+        if self.shortestJobFirstQueue:
+            return self.shortestJobFirstQueue[0][2]
+        return None
+
+
+class MultiCoreMLFQ:
+    def __init__(self, num_cores, rr_allotment, fcfs_allotment, context_switch_time, rr_time_quantum=RR_TIME_QUANTUM,
+                 balance="least-loaded", work_stealing=True):
+        if num_cores < 1:
+            raise ValueError(f"The number of cores must be at least 1, got {num_cores}")
+        if balance not in BALANCE_POLICIES:
+            raise ValueError(f"Unknown balancing policy {balance!r}; expected one of {', '.join(BALANCE_POLICIES)}")
+
+        self.currentGlobalTime = 0
+        self.cores = [Core(core_id) for core_id in range(num_cores)]
+        self.rrTimeQuantum = rr_time_quantum
+        self.rrTimeAllotment = rr_allotment
+        self.fcfsTimeAllotment = fcfs_allotment
+        self.contextSwitch = context_switch_time
+        self.balance = balance
+        self.workStealing = work_stealing
+        self.nextCore = 0  # Next core for round-robin placement
+        self.homeCores = {}  # processID -> the core a process goes back to after I/O
+        self.ioProcesses = []  # Heap of (time the I/O burst ends, sequence number, process)
+        self.ioSequence = 0
+        self.arrivals = ArrivalStream([])
+        self.retire = None  # If set, called with every process, and the level it completed in, as soon as it is done.
+
+
+def _enqueue(core: Core, process):
+    if process.currentQueue == RR_HIGH_PRIORITY:
+        core.roundRobinQueue.append(process)
+    elif process.currentQueue == FCFS_MEDIUM_PRIORITY:
+        core.firstComeFirstServeQueue.append(process)
+    else:
+        heapq.heappush(core.shortestJobFirstQueue, (process.remainingCpuTime, process.processID, process))
+
+
+def submit_process(MLFQ: MultiCoreMLFQ, process):
+    # Puts a process that arrives at the current time on a core.
+    if MLFQ.balance == "round-robin":
+        core = MLFQ.cores[MLFQ.nextCore]
+        MLFQ.nextCore = (MLFQ.nextCore + 1) % len(MLFQ.cores)
+    else:
+        core = min(MLFQ.cores, key=len)
+    MLFQ.homeCores[process.processID] = core
+    _enqueue(core, process)
+
+
+def _admit_arrivals(MLFQ: MultiCoreMLFQ):
+    while MLFQ.arrivals.peek() is not None and MLFQ.arrivals.peek().arrivalTime <= MLFQ.currentGlobalTime:
+        submit_process(MLFQ, MLFQ.arrivals.pop())
+
+
+def _finish_io_bursts(MLFQ: MultiCoreMLFQ):
+    while MLFQ.ioProcesses and MLFQ.ioProcesses[0][0] <= MLFQ.currentGlobalTime:
+        process = heapq.heappop(MLFQ.ioProcesses)[2]
+        if process.next_burst():
+            _enqueue(MLFQ.homeCores[process.processID], process)
+        else:
+            _finish_process(MLFQ, process, MLFQ.currentGlobalTime)
+
+
+def _finish_process(MLFQ: MultiCoreMLFQ, process, time: int):
+    level, process.currentQueue = process.currentQueue, NULL_QUEUE_PRIORITY
+    process.completionTime = time
+    del MLFQ.homeCores[process.processID]
+    if MLFQ.retire is not None:
+        MLFQ.retire(process, level)
+
+
+def _take_waiting_process(core: Core):
+    # Takes a queued process other than the one the core is running, from the highest level that has one.
+    for queue in (core.roundRobinQueue, core.firstComeFirstServeQueue):
+        if queue and queue[-1] is not core.lastProcess:
+            return queue.pop()
+        if len(queue) > 1:
+            process = queue[-2]
+            del queue[-2]
+            return process
+
+    heap = core.shortestJobFirstQueue
+    if heap and heap[0][2] is not core.lastProcess:
+        return heapq.heappop(heap)[2]
+    if len(heap) > 1:
+        process = heap.pop(1 if len(heap) == 2 or heap[1] < heap[2] else 2)[2]
+        heapq.heapify(heap)
+        return process
+    return None
+
+
+def _steal_work(MLFQ: MultiCoreMLFQ):
+    idle_cores = [core for core in MLFQ.cores if not core.switchRemaining and not len(core)]
+    if not idle_cores:
+        return
+
+    # Busiest cores first. A core that has a single process is probably running it, so it is left alone.
+    victims = [(-len(core), core.coreID, core) for core in MLFQ.cores if len(core) > 1]
+    heapq.heapify(victims)
+    for thief in idle_cores:
+        if not victims:
+            break
+        _, _, victim = heapq.heappop(victims)
+        process = _take_waiting_process(victim)
+        if process is None:
+            continue
+
+        MLFQ.homeCores[process.processID] = thief
+        _enqueue(thief, process)
+        thief.stolenProcesses += 1
+        if len(victim) > 1:
+            heapq.heappush(victims, (-len(victim), victim.coreID, victim))
+
+
+def _run_core(MLFQ: MultiCoreMLFQ, core: Core):
+    # Simulates one ms on the core. Returns False if the core had nothing to do.
+    if core.switchRemaining:
+        core.switchRemaining -= 1
+        core.switchTime += 1
+        return True
+
+    process = core.head()
+    if process is None:
+        return False
+
+    if process is not core.lastProcess:
+        previous_process, core.lastProcess = core.lastProcess, process
+        if process.firstRunTime < 0:
+            process.firstRunTime = MLFQ.currentGlobalTime
+        if previous_process is not None and MLFQ.contextSwitch > 0:
+            core.contextSwitches += 1
+            core.switchTime += 1
+            core.switchRemaining = MLFQ.contextSwitch - 1
+            process.processCSTime += MLFQ.contextSwitch
+            return True
+
+    core.busyTime += 1
+    process.remainingBurst -= 1
+    process.remainingCpuTime -= 1
+    process.usedTimeQuantum += 1
+    process.usedTimeAllotment += 1
+
+    if process.remainingBurst == 0:
+        # The process is the first of its level, so it is the one taken off.
+        if process.currentQueue == RR_HIGH_PRIORITY:
+            core.roundRobinQueue.popleft()
+        elif process.currentQueue == FCFS_MEDIUM_PRIORITY:
+            core.firstComeFirstServeQueue.popleft()
+        else:
+            heapq.heappop(core.shortestJobFirstQueue)
+        process.usedTimeQuantum = 0
+        process.usedTimeAllotment = 0
+
+        if process.next_burst():
+            heapq.heappush(MLFQ.ioProcesses, (MLFQ.currentGlobalTime + 1 + process.remainingBurst, MLFQ.ioSequence, process))
+            MLFQ.ioSequence += 1
+        else:
+            _finish_process(MLFQ, process, MLFQ.currentGlobalTime + 1)
+
+    elif process.currentQueue == RR_HIGH_PRIORITY and process.usedTimeAllotment >= MLFQ.rrTimeAllotment:
+        core.roundRobinQueue.popleft()
+        process.currentQueue = FCFS_MEDIUM_PRIORITY
+        process.usedTimeQuantum = 0
+        process.usedTimeAllotment = 0
+        core.firstComeFirstServeQueue.append(process)
+
+    elif process.currentQueue == RR_HIGH_PRIORITY and process.usedTimeQuantum >= MLFQ.rrTimeQuantum:
+        process.usedTimeQuantum = 0
+        core.roundRobinQueue.rotate(-1)
+
+    elif process.currentQueue == FCFS_MEDIUM_PRIORITY and process.usedTimeAllotment >= MLFQ.fcfsTimeAllotment:
+        core.firstComeFirstServeQueue.popleft()
+        process.currentQueue = SJF_LOW_PRIORITY
+        process.usedTimeAllotment = 0
+        heapq.heappush(core.shortestJobFirstQueue, (process.remainingCpuTime, process.processID, process))
+
+    elif process.currentQueue == SJF_LOW_PRIORITY:
+        # Its key only went down, so it stays at the top of the heap.
+        core.shortestJobFirstQueue[0] = (process.remainingCpuTime, process.processID, process)
+
+    return True
+
+
+def run_multicore_scheduler(MLFQ: MultiCoreMLFQ, process_list):
+    # process_list has to be ordered by arrival time, as for mlfq.run_mlfq_scheduler().
+    # Returns every process, once they are all done.
+    MLFQ.arrivals = ArrivalStream(process_list, retain=not isinstance(process_list, list))
+    advance_multicore(MLFQ)
+    return process_list if isinstance(process_list, list) else MLFQ.arrivals.drain()
+
+
+def advance_multicore(MLFQ: MultiCoreMLFQ, until: int = None):
+    # Simulates the time steps before `until`, or, without it, until every process is done.
+    while until is None or MLFQ.currentGlobalTime < until:
+        _admit_arrivals(MLFQ)
+        _finish_io_bursts(MLFQ)
+        if MLFQ.workStealing:
+            _steal_work(MLFQ)
+
+        busy = False
+        for core in MLFQ.cores:
+            busy = _run_core(MLFQ, core) or busy
+
+        if busy:
+            MLFQ.currentGlobalTime += 1
+            continue
+
+        # Every core is idle, so nothing happens until the next arrival or the end of the next I/O burst.
+        upcoming = []
+        if MLFQ.arrivals.peek() is not None:
+            upcoming.append(MLFQ.arrivals.peek().arrivalTime)
+        if MLFQ.ioProcesses:
+            upcoming.append(MLFQ.ioProcesses[0][0])
+        if until is not None:
+            upcoming.append(until)
+        if not upcoming:
+            break
+        MLFQ.currentGlobalTime = max(min(upcoming), MLFQ.currentGlobalTime + 1)
+
+
+def summarize_multicore(MLFQ: MultiCoreMLFQ, process_list):
+    for process in process_list:
+        process.turnaroundTime = process.completionTime - process.arrivalTime
+        process.waitingTime = process.turnaroundTime - process.totalBurstTime - process.processCSTime
+
+    makespan = MLFQ.currentGlobalTime
+    return {
+        "processes": len(process_list),
+        "average_turnaround": sum(p.turnaroundTime for p in process_list) / len(process_list),
+        "average_waiting": sum(p.waitingTime for p in process_list) / len(process_list),
+        "makespan": makespan,
+        "total_context_switch_time": sum(core.switchTime for core in MLFQ.cores),
+        "cores": [{
+            "core": core.coreID,
+            "busy_ms": core.busyTime,
+            "context_switch_ms": core.switchTime,
+            "idle_ms": makespan - core.busyTime - core.switchTime,
+            "utilization": core.busyTime / makespan if makespan else 0.0,
+            "context_switches": core.contextSwitches,
+            "stolen_processes": core.stolenProcesses,
+        } for core in MLFQ.cores],
+    }
+
+
+def print_multicore_summary(MLFQ: MultiCoreMLFQ, process_list, per_process=True):
+    summary = summarize_multicore(MLFQ, process_list)
+    print("SIMULATION DONE\n")
+
+    if per_process:
+        for process in sorted(process_list, key=lambda p: p.processName):
+            print(f"Turn-around time for Process {process.processName} : {process.completionTime} - {process.arrivalTime} = {process.turnaroundTime} ms")
+        print()
+    print(f"Average Turn-around time = {round(summary['average_turnaround'], 4)} ms\n")
+
+    if per_process:
+        for process in sorted(process_list, key=lambda p: p.processName):
+            print(f"Waiting time for Process {process.processName} : {process.waitingTime} ms")
+        print()
+    print(f"Average Waiting time = {round(summary['average_waiting'], 4)} ms")
+    print(f"Makespan = {summary['makespan']} ms\n")
+
+    print("Core  Utilization  Busy ms  CS ms  Idle ms  Switches  Stolen")
+    for core in summary["cores"]:
+        print(f"{core['core']:>4}  {core['utilization']:>10.1%}  {core['busy_ms']:>7}  {core['context_switch_ms']:>5}  "
+              f"{core['idle_ms']:>7}  {core['context_switches']:>8}  {core['stolen_processes']:>6}")
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate an MLFQ scheduler on several CPU cores.")
+    parser.add_argument("input_files", nargs="*", default=["set1.txt", "set2.txt"], help="workload files to simulate (default: set1.txt set2.txt)")
+    parser.add_argument("--cores", type=int, default=os.cpu_count() or 1, help="number of cores (default: one per CPU of this machine)")
+    parser.add_argument("--balance", choices=BALANCE_POLICIES, default="least-loaded",
+                        help="how arriving processes are spread over the cores (default: least-loaded)")
+    parser.add_argument("--no-stealing", action="store_true", help="do not let idle cores take waiting processes from busy ones")
+    parser.add_argument("--quantum", type=int, default=RR_TIME_QUANTUM, help=f"RR time quantum (default: {RR_TIME_QUANTUM})")
+    parser.add_argument("--stream", action="store_true", help="read each workload lazily while simulating it")
+    parser.add_argument("--no-per-process", action="store_true", help="only print the averages and the per-core table")
+    args = parser.parse_args(argv)
+
+    for idx, input_file in enumerate(args.input_files):
+        if idx > 0:
+            print("-" * 100)
+        with contextlib.ExitStack() as stack:
+            if is_compiled_workload(input_file):
+                num_processes, rr_allotment, fcfs_allotment, context_switch_time, process_list = CompiledWorkload(input_file).parse(lazy=args.stream)
+            elif args.stream:
+                num_processes, rr_allotment, fcfs_allotment, context_switch_time, process_list = read_input(stack.enter_context(open(input_file, "r")))
+            else:
+                with open(input_file, "r") as file:
+                    num_processes, rr_allotment, fcfs_allotment, context_switch_time, process_list = parse_input(file.read())
+
+            mlfq = MultiCoreMLFQ(args.cores, rr_allotment, fcfs_allotment, context_switch_time, args.quantum,
+                                 balance=args.balance, work_stealing=not args.no_stealing)
+            process_list = run_multicore_scheduler(mlfq, process_list)
+        print_multicore_summary(mlfq, process_list, per_process=not args.no_per_process)
+
+
+if __name__ == "__main__":
+    main()
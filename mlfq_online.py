@@ -0,0 +1,246 @@
+# Online mode for the MLFQ simulator.
+#
+# Instead of a workload file known in advance, processes are submitted one line at a time
+# ("name;arrival;cpu;io;cpu...", as in the workload files) on standard input or to a local TCP or Unix
+# socket, and the simulation runs for as long as submissions keep coming. Submissions have to arrive in
+# order of arrival time; the simulation is only ever advanced up to the arrival time of the latest one,
+# and the rest is simulated when the input ends (or on Ctrl-C or SIGTERM). A submission that arrives before the
+# simulated time, or that cannot be parsed, is reported on stderr and skipped.
+#
+# Processes are retired as soon as they are done: only running totals and percentile estimates are kept
+# (see mlfq.SummaryStatistics), so memory stays flat however long the trace is. Scheduling is done by the
+# multi-core simulator (see mlfq_multicore.py), with one core by default, which keeps the queues running
+# while some processes do I/O and waits for later arrivals when every queue is empty.
+#
+# If the first line of standard input is not a process, it is read as the header of a workload file
+# (process count, RR and FCFS time allotments, context switch time), so workload files can be replayed:
+#   python mlfq_online.py --report-every 1000 < big.txt
+#   python mlfq_online.py --listen 127.0.0.1:9140 --cores 8
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import signal
+import sys
+import threading
+
+from mlfq import RR_TIME_QUANTUM, SummaryStatistics, parse_process_line
+from mlfq_multicore import BALANCE_POLICIES, MultiCoreMLFQ, advance_multicore, submit_process
+
+
+class RunningSummary:
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.statistics = SummaryStatistics()
+
+    def add(self, process, level: int):
+        process.turnaroundTime = process.completionTime - process.arrivalTime
+        process.waitingTime = process.turnaroundTime - process.totalBurstTime - process.processCSTime
+
+        self.completed += 1
+        self.statistics.add(process, level)
+
+    def report(self, MLFQ: MultiCoreMLFQ):
+        report = {
+            "time": MLFQ.currentGlobalTime,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "in_flight": self.submitted - self.completed,
+            "busy_ms": sum(core.busyTime for core in MLFQ.cores),
+            "context_switch_ms": sum(core.switchTime for core in MLFQ.cores),
+        }
+        for metric, statistic in self.statistics.groups["all"].items():
+            figures = statistic.report()
+            report[f"average_{metric}"] = figures.pop("mean") or 0.0
+            for name, value in figures.items():
+                if name != "count":
+                    report[f"{name}_{metric}"] = value
+        return report
+
+
+def print_running_summary(MLFQ: MultiCoreMLFQ, summary: RunningSummary):
+    report = summary.report(MLFQ)
+    print(f"At Time = {report['time']}: {report['completed']} done, {report['in_flight']} in flight, "
+          f"average turn-around time = {round(report['average_turnaround'], 4)} ms "
+          f"(min {report['min_turnaround']}, max {report['max_turnaround']}, p95 {_round(report['p95_turnaround'])}), "
+          f"average waiting time = {round(report['average_waiting'], 4)} ms "
+          f"(min {report['min_waiting']}, max {report['max_waiting']}, p95 {_round(report['p95_waiting'])}), "
+          f"average response time = {round(report['average_response'], 4)} ms", flush=True)
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+async def run_online(MLFQ: MultiCoreMLFQ, submissions: asyncio.Queue, summary: RunningSummary):
+    # Takes process lines from `submissions` until it yields None, then finishes the simulation.
+    while True:
+        line = await submissions.get()
+        if line is None:
+            break
+        if not line.strip():
+            continue
+
+        try:
+            process = parse_process_line(line, summary.submitted + 1, summary.submitted + 1)
+            if process.arrivalTime < MLFQ.currentGlobalTime:
+                raise ValueError(f"process {process.processName} arrives at {process.arrivalTime}, "
+                                 f"but the simulation is already at {MLFQ.currentGlobalTime}")
+        except ValueError as error:
+            print(f"Skipped submission: {error}", file=sys.stderr)
+            continue
+
+        advance_multicore(MLFQ, until=process.arrivalTime)
+        summary.submitted += 1
+        submit_process(MLFQ, process)
+
+    advance_multicore(MLFQ)
+
+
+async def _feed_lines(reader: asyncio.StreamReader, submissions: asyncio.Queue):
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        await submissions.put(line.decode())
+
+
+class _FileLineReader:
+    # Regular files cannot be watched by the event loop, so they are read by a thread instead. The thread
+    # hands over about 64 kB of lines at a time through a bounded queue, and waits while the queue is full,
+    # so the file is never read much further than the simulation has got.
+    def __init__(self, file, loop: asyncio.AbstractEventLoop):
+        self.chunks = asyncio.Queue(maxsize=4)
+        self.lines = collections.deque()
+        self.eof = False
+
+        def feed():
+            while True:
+                lines = file.readlines(1 << 16)
+                try:
+                    asyncio.run_coroutine_threadsafe(self.chunks.put(lines), loop).result()
+                except (RuntimeError, concurrent.futures.CancelledError):  # The event loop has stopped.
+                    return
+                if not lines:
+                    return
+
+        # A daemon thread, so that a run stopped with Ctrl-C does not wait for it to finish reading.
+        threading.Thread(target=feed, daemon=True).start()
+
+    async def readline(self):
+        while not self.lines and not self.eof:
+            lines = await self.chunks.get()
+            self.lines.extend(lines)
+            self.eof = not lines
+        return self.lines.popleft() if self.lines else b""
+
+
+async def _open_stdin():
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    except ValueError:
+        return _FileLineReader(sys.stdin.buffer, loop)
+    return reader
+
+
+async def _read_workload_header(reader: asyncio.StreamReader, args: argparse.Namespace):
+    # Returns the first process line, after taking the scheduler parameters from a workload file header if there is one.
+    line = (await reader.readline()).decode()
+    while line and not line.strip():
+        line = (await reader.readline()).decode()
+    if not line or ";" in line:
+        return line
+
+    header = [line] + [(await reader.readline()).decode() for _ in range(3)]
+    try:
+        _, args.rr_allotment, args.fcfs_allotment, args.context_switch = [int(value) for value in header]
+    except ValueError:
+        raise SystemExit("The first four lines must be the number of processes, the RR and FCFS time allotments and the context switch time.")
+    return ""
+
+
+async def _main(args: argparse.Namespace):
+    submissions = asyncio.Queue(maxsize=1024)
+
+    if args.listen:
+        if ":" in args.listen:
+            host, port = args.listen.rsplit(":", 1)
+            server = await asyncio.start_server(lambda reader, writer: _feed_lines(reader, submissions), host, int(port))
+        else:
+            server = await asyncio.start_unix_server(lambda reader, writer: _feed_lines(reader, submissions), args.listen)
+        print(f"Listening on {args.listen}", file=sys.stderr)
+        first_line = ""
+    else:
+        server = None
+        reader = await _open_stdin()
+        first_line = await _read_workload_header(reader, args)
+
+    MLFQ = MultiCoreMLFQ(args.cores, args.rr_allotment, args.fcfs_allotment, args.context_switch, args.quantum,
+                         balance=args.balance, work_stealing=not args.no_stealing)
+    summary = RunningSummary()
+
+    def retire(process, level):
+        summary.add(process, level)
+        if args.per_process:
+            print(f"{process.processName} DONE at {process.completionTime}: turn-around time = {process.turnaroundTime} ms, "
+                  f"waiting time = {process.waitingTime} ms", flush=True)
+        if args.report_every and summary.completed % args.report_every == 0:
+            print_running_summary(MLFQ, summary)
+
+    MLFQ.retire = retire
+
+    # Ctrl-C or SIGTERM stops taking submissions, and the ones taken so far are simulated to the end.
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, asyncio.current_task().cancel)
+        except NotImplementedError:  # Windows
+            pass
+
+    async def feed_stdin():
+        if first_line:
+            await submissions.put(first_line)
+        await _feed_lines(reader, submissions)
+        await submissions.put(None)
+
+    feeder = asyncio.create_task(feed_stdin()) if server is None else None
+    try:
+        await run_online(MLFQ, submissions, summary)
+    except asyncio.CancelledError:
+        advance_multicore(MLFQ)
+    finally:
+        if server is not None:
+            server.close()
+        if feeder is not None:
+            feeder.cancel()
+
+    print_running_summary(MLFQ, summary)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the MLFQ scheduler online, on processes submitted while it runs.")
+    parser.add_argument("--listen", metavar="ADDRESS",
+                        help="take submissions on a local socket (HOST:PORT for TCP, or a path for a Unix socket) instead of standard input")
+    parser.add_argument("--rr-allotment", type=int, default=8, help="RR time allotment (default: 8, or the workload header)")
+    parser.add_argument("--fcfs-allotment", type=int, default=8, help="FCFS time allotment (default: 8, or the workload header)")
+    parser.add_argument("--context-switch", type=int, default=1, help="context switch time (default: 1, or the workload header)")
+    parser.add_argument("--quantum", type=int, default=RR_TIME_QUANTUM, help=f"RR time quantum (default: {RR_TIME_QUANTUM})")
+    parser.add_argument("--cores", type=int, default=1, help="number of cores (default: 1)")
+    parser.add_argument("--balance", choices=BALANCE_POLICIES, default="least-loaded", help="placement policy with several cores")
+    parser.add_argument("--no-stealing", action="store_true", help="do not let idle cores take waiting processes from busy ones")
+    parser.add_argument("--report-every", type=int, default=0, metavar="N", help="print the running summary after every N completions")
+    parser.add_argument("--per-process", action="store_true", help="print a line for every process as it is retired")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+# Parameter sweep for the MLFQ simulator.
+#
+# Reruns one workload for every combination of RR time allotment, FCFS time allotment, context switch
+# time and RR time quantum, spreading the runs over a pool of worker processes. Each run uses the
+# event-driven engine with tracing off and only its summary figures (see summarize_simulation()) are
+# sent back, so the sweep is bound by simulation work rather than by printing.
+#
+# With --fork-at, the first part of the workload is simulated only once, with the parameters in the file,
+# and every combination carries on from a checkpoint of that run (see mlfq.fork_scheduler()).
+#
+# With --cache, the row of every combination is kept in a result cache (see mlfq.ResultCache), and
+# combinations that were run before on the same workload are not simulated again.
+#
+# The workload can also be a compiled one (see mlfq.compile_workload()), which every worker maps
+# instead of parsing the text again.
+#
+# Example:
+#   python mlfq_sweep.py set1.txt --rr-allotment 4:16:4 --fcfs-allotment 4,8 --context-switch 0:3 --quantum 2,4,8
+#   python mlfq_sweep.py big.txt --context-switch 1:5 --fork-at 50000
+#   python mlfq_sweep.py big.txt --context-switch 1:5 --cache ~/.cache/mlfq
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import sys
+
+import mlfq
+
+SWEEP_COLUMNS = ["rr_allotment", "fcfs_allotment", "context_switch", "rr_quantum", "processes",
+                 "average_turnaround", "average_waiting", "makespan", "total_context_switch_time", "error"]
+
+# Every worker parses the workload text (or reads the compiled workload, or restores the checkpoint) it was
+# started with, so that each run gets its own fresh Process objects (the scheduler updates them in place).
+_worker_file_content = None
+_worker_checkpoint = None
+_worker_cache = None  # (ResultCache, the fields every key of this sweep shares), if caching.
+
+
+def _init_worker(file_content: str, checkpoint: bytes = None, cache: tuple = None):
+    global _worker_file_content, _worker_checkpoint, _worker_cache
+    _worker_file_content = file_content
+    _worker_checkpoint = checkpoint
+    if cache is not None:
+        cache_directory, cache_size, key_fields = cache
+        _worker_cache = (mlfq.ResultCache(cache_directory, cache_size), key_fields)
+
+
+def _run_combination(combination: tuple):
+    if _worker_cache is None:
+        return _simulate_combination(combination)
+
+    cache, key_fields = _worker_cache
+    key = mlfq.result_cache_key(parameters=list(combination), **key_fields)
+    row = cache.get(key)
+    if row is None:
+        row = _simulate_combination(combination)
+        cache.put(key, row)
+    return row
+
+
+def _simulate_combination(combination: tuple):
+    rr_allotment, fcfs_allotment, context_switch_time, rr_time_quantum = combination
+    if _worker_checkpoint is None:
+        process_list = _parse_workload(_worker_file_content)[4]
+        scheduler = mlfq.MLFQ(rr_allotment, fcfs_allotment, context_switch_time, rr_time_quantum)
+    else:
+        process_list = None
+        scheduler = mlfq.fork_scheduler(_worker_checkpoint, rr_allotment, fcfs_allotment, context_switch_time, rr_time_quantum)
+
+    row = {"rr_allotment": rr_allotment, "fcfs_allotment": fcfs_allotment,
+           "context_switch": context_switch_time, "rr_quantum": rr_time_quantum}
+    try:
+        mlfq.run_mlfq_scheduler_event_driven(scheduler, process_list, mlfq.TraceSink(mlfq.TRACE_OFF))
+    except (RuntimeError, IndexError) as error:
+        row["error"] = _run_error(error)
+        return row
+
+    row.update(mlfq.summarize_simulation(scheduler, scheduler.processList))
+    return row
+
+
+def _run_error(error: Exception):
+    # The engines raise RuntimeError when the scheduler stalls, and IndexError when no process arrives at time 0.
+    return str(error) if isinstance(error, RuntimeError) else "No process arrives at Time = 0."
+
+
+def _parse_workload(file_content):
+    # file_content is the text of a workload file, or a mlfq.CompiledWorkload.
+    if isinstance(file_content, mlfq.CompiledWorkload):
+        return file_content.parse()
+    return mlfq.parse_input(file_content)
+
+
+def _shared_prefix_checkpoint(file_content, fork_at: int):
+    _, rr_allotment, fcfs_allotment, context_switch_time, process_list = _parse_workload(file_content)
+    scheduler = mlfq.MLFQ(rr_allotment, fcfs_allotment, context_switch_time)
+    mlfq.run_mlfq_scheduler_event_driven(scheduler, process_list, mlfq.TraceSink(mlfq.TRACE_OFF), until=fork_at)
+    return mlfq.checkpoint_scheduler(scheduler)
+
+
+def parse_values(text: str):
+    # "4,8,16" lists the values; "4:16:4" is the range 4, 8, 12, 16 (the step defaults to 1).
+    values = []
+    for part in text.split(","):
+        if ":" in part:
+            bounds = [int(bound) for bound in part.split(":")]
+            start, stop = bounds[0], bounds[1]
+            step = bounds[2] if len(bounds) > 2 else 1
+            if step <= 0:
+                raise argparse.ArgumentTypeError(f"the step of {part!r} must be positive")
+            values.extend(range(start, stop + 1, step))
+        else:
+            values.append(int(part))
+    return values
+
+
+def _cache_key_fields(file_content, fork_at=None):
+    if isinstance(file_content, mlfq.CompiledWorkload):
+        digest = file_content.digest()
+    else:
+        digest = mlfq.workload_digest(file_content)
+    fields = {"workload": digest, "kind": "sweep"}
+    if fork_at is not None:
+        # The shared prefix is simulated with the parameters in the file.
+        fields["fork_at"] = fork_at
+        fields["prefix_parameters"] = list(_parse_workload(file_content)[1:4])
+    return fields
+
+
+def sweep(file_content, rr_allotments, fcfs_allotments, context_switch_times, rr_time_quanta, workers=None, fork_at=None,
+          cache_directory=None, cache_size=mlfq.DEFAULT_CACHE_SIZE):
+    # Returns one row (a dictionary) per combination, in the order of the combinations.
+    combinations = list(itertools.product(rr_allotments, fcfs_allotments, context_switch_times, rr_time_quanta))
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(1, len(combinations) // (workers * 4))
+
+    cache = None
+    if cache_directory is not None:
+        cache = (cache_directory, cache_size, _cache_key_fields(file_content, fork_at))
+        cached_rows = _cached_rows(mlfq.ResultCache(cache_directory, cache_size), cache[2], combinations)
+        if cached_rows is not None:
+            return cached_rows
+
+    checkpoint = None
+    if fork_at is not None:
+        try:
+            checkpoint = _shared_prefix_checkpoint(file_content, fork_at)
+        except (RuntimeError, IndexError) as error:
+            return [{"rr_allotment": rr_allotment, "fcfs_allotment": fcfs_allotment, "context_switch": context_switch_time,
+                     "rr_quantum": rr_time_quantum, "error": _run_error(error)}
+                    for rr_allotment, fcfs_allotment, context_switch_time, rr_time_quantum in combinations]
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(file_content, checkpoint, cache)) as pool:
+        return pool.map(_run_combination, combinations, chunksize=chunk_size)
+
+
+def _cached_rows(cache, key_fields: dict, combinations: list):
+    # Every row from the cache, or None if any is missing (then the workers fill in the missing ones).
+    rows = []
+    for combination in combinations:
+        row = cache.get(mlfq.result_cache_key(parameters=list(combination), **key_fields))
+        if row is None:
+            return None
+        rows.append(row)
+    return rows
+
+
+def write_table(rows, file, columns=SWEEP_COLUMNS):
+    columns = [column for column in columns if any(column in row for row in rows)]
+    cells = [[_format_cell(row.get(column, "")) for column in columns] for row in rows]
+    widths = [max([len(column)] + [len(line[idx]) for line in cells]) for idx, column in enumerate(columns)]
+
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)), file=file)
+    for line in cells:
+        print("  ".join(cell.rjust(width) for cell, width in zip(line, widths)), file=file)
+
+
+def _format_cell(value):
+    return f"{round(value, 4)}" if isinstance(value, float) else str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run one MLFQ workload across many scheduler parameter combinations in parallel.")
+    parser.add_argument("input_file", help="workload file in the set1.txt format, or compiled with mlfq.py --compile")
+    parser.add_argument("--rr-allotment", type=parse_values, help="RR time allotments, e.g. 4,8,16 or 4:16:4 (default: the one in the file)")
+    parser.add_argument("--fcfs-allotment", type=parse_values, help="FCFS time allotments (default: the one in the file)")
+    parser.add_argument("--context-switch", type=parse_values, help="context switch times (default: the one in the file)")
+    parser.add_argument("--quantum", type=parse_values, help=f"RR time quanta (default: {mlfq.RR_TIME_QUANTUM})")
+    parser.add_argument("--fork-at", type=int, metavar="TIME",
+                        help="simulate the first TIME ms once with the parameters in the file, and only vary them from there on")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--csv", help="write the results to this CSV file instead of printing a table")
+    parser.add_argument("--cache", metavar="DIR", help="reuse the rows of combinations run before, cached in DIR")
+    parser.add_argument("--cache-size", type=int, default=mlfq.DEFAULT_CACHE_SIZE // (1024 * 1024), metavar="MB",
+                        help=f"evict the least recently used cache entries beyond this size (default: {mlfq.DEFAULT_CACHE_SIZE // (1024 * 1024)})")
+    args = parser.parse_args(argv)
+
+    if mlfq.is_compiled_workload(args.input_file):
+        file_content = mlfq.CompiledWorkload(args.input_file)
+        rr_allotment, fcfs_allotment, context_switch_time = file_content.rrTimeAllotment, file_content.fcfsTimeAllotment, file_content.contextSwitch
+    else:
+        with open(args.input_file, "r") as file:
+            file_content = file.read()
+        # Only the header is needed here; every worker parses the processes for itself.
+        try:
+            rr_allotment, fcfs_allotment, context_switch_time = [int(line) for line in file_content.strip().split("\n", 4)[1:4]]
+        except ValueError:
+            parser.error(f"{args.input_file} does not start with the process count, the RR and FCFS time allotments and the context switch time")
+
+    rows = sweep(file_content,
+                 args.rr_allotment or [rr_allotment],
+                 args.fcfs_allotment or [fcfs_allotment],
+                 args.context_switch or [context_switch_time],
+                 args.quantum or [mlfq.RR_TIME_QUANTUM],
+                 args.workers,
+                 args.fork_at,
+                 args.cache,
+                 args.cache_size * 1024 * 1024)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=SWEEP_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        write_table(rows, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Synthetic workloads for the MLFQ simulator.
+#
+# Writes a workload in the set1.txt format (the process count, the RR time allotment, the FCFS time
+# allotment and the context switch time, a blank line, then one "name;arrival;cpu;io;cpu..." line per
+# process). The same seed always gives the same workload.
+#
+# Every process gets between 1 and --max-cpu-bursts CPU bursts, with an I/O burst between each two of
+# them. CPU bursts are drawn from --cpu-distribution with mean --cpu-mean; I/O bursts use the same
+# distribution, scaled so that on average --io-ratio of a process's burst time is spent on I/O (0 means
+# no I/O at all). Arrivals are a Poisson process, evenly spaced ("periodic") or all at time 0 ("batch"),
+# --mean-interarrival ms apart on average.
+#
+# Example:
+#   python mlfq_workload.py 100000 --seed 7 --io-ratio 0.3 --arrivals poisson -o big.txt
+
+import argparse
+import random
+import sys
+
+BURST_DISTRIBUTIONS = ["constant", "uniform", "exponential"]
+ARRIVAL_PROCESSES = ["poisson", "periodic", "batch"]
+
+
+def _burst_sampler(rng: random.Random, distribution: str, mean: float):
+    if distribution == "constant":
+        length = max(1, round(mean))
+        return lambda: length
+    if distribution == "uniform":
+        highest = max(1, round(2 * mean) - 1)
+        return lambda: rng.randint(1, highest)
+    if distribution == "exponential":
+        return lambda: max(1, round(rng.expovariate(1 / mean)))
+    raise ValueError(f"Unknown burst distribution {distribution!r}; expected one of {', '.join(BURST_DISTRIBUTIONS)}")
+
+
+def generate_workload(num_processes: int, seed=0, rr_allotment=8, fcfs_allotment=8, context_switch_time=1,
+                      cpu_mean=10.0, cpu_distribution="exponential", io_ratio=0.25, max_cpu_bursts=3,
+                      arrivals="poisson", mean_interarrival=10.0):
+    # Yields the lines of the workload, so that large ones never have to be held in memory.
+    if num_processes < 1 or max_cpu_bursts < 1:
+        raise ValueError("A workload needs at least one process, and processes at least one CPU burst")
+    if not 0 <= io_ratio < 1:
+        raise ValueError(f"The I/O ratio must be at least 0 and below 1, got {io_ratio}")
+    if arrivals not in ARRIVAL_PROCESSES:
+        raise ValueError(f"Unknown arrival process {arrivals!r}; expected one of {', '.join(ARRIVAL_PROCESSES)}")
+
+    rng = random.Random(seed)
+    cpu_burst = _burst_sampler(rng, cpu_distribution, cpu_mean)
+    io_burst = _burst_sampler(rng, cpu_distribution, cpu_mean * io_ratio / (1 - io_ratio)) if io_ratio else None
+
+    yield str(num_processes)
+    yield str(rr_allotment)
+    yield str(fcfs_allotment)
+    yield str(context_switch_time)
+    yield ""
+
+    arrival_time = 0.0
+    for idx in range(num_processes):
+        if idx and arrivals == "poisson":
+            arrival_time += rng.expovariate(1 / mean_interarrival)
+        elif idx and arrivals == "periodic":
+            arrival_time += mean_interarrival
+
+        bursts = [cpu_burst()]
+        if io_burst:
+            for _ in range(rng.randint(1, max_cpu_bursts) - 1):
+                bursts.append(io_burst())
+                bursts.append(cpu_burst())
+        yield ";".join([f"P{idx + 1}", str(int(arrival_time))] + [str(burst) for burst in bursts])
+
+
+def workload_text(num_processes: int, **options):
+    return "\n".join(generate_workload(num_processes, **options)) + "\n"
+
+
+def add_workload_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--rr-allotment", type=int, default=8, help="RR time allotment (default: 8)")
+    parser.add_argument("--fcfs-allotment", type=int, default=8, help="FCFS time allotment (default: 8)")
+    parser.add_argument("--context-switch", type=int, default=1, help="context switch time (default: 1)")
+    parser.add_argument("--cpu-mean", type=float, default=10.0, help="mean CPU burst length in ms (default: 10)")
+    parser.add_argument("--cpu-distribution", choices=BURST_DISTRIBUTIONS, default="exponential",
+                        help="distribution of the CPU and I/O burst lengths (default: exponential)")
+    parser.add_argument("--io-ratio", type=float, default=0.25, help="average share of burst time spent on I/O, 0 for none (default: 0.25)")
+    parser.add_argument("--max-cpu-bursts", type=int, default=3, help="most CPU bursts a process can have (default: 3)")
+    parser.add_argument("--arrivals", choices=ARRIVAL_PROCESSES, default="poisson", help="arrival process (default: poisson)")
+    parser.add_argument("--mean-interarrival", type=float, default=10.0, help="mean time between arrivals in ms (default: 10)")
+
+
+def workload_options(args: argparse.Namespace):
+    # The generate_workload() keyword arguments given by the options of add_workload_arguments().
+    return dict(seed=args.seed, rr_allotment=args.rr_allotment, fcfs_allotment=args.fcfs_allotment,
+                context_switch_time=args.context_switch, cpu_mean=args.cpu_mean, cpu_distribution=args.cpu_distribution,
+                io_ratio=args.io_ratio, max_cpu_bursts=args.max_cpu_bursts, arrivals=args.arrivals,
+                mean_interarrival=args.mean_interarrival)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic workload in the MLFQ input format.")
+    parser.add_argument("num_processes", type=int, help="number of processes")
+    add_workload_arguments(parser)
+    parser.add_argument("-o", "--output", help="file to write the workload to (default: standard output)")
+    args = parser.parse_args(argv)
+
+    lines = generate_workload(args.num_processes, **workload_options(args))
+
+    file = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for line in lines:
+            file.write(line + "\n")
+    finally:
+        if args.output:
+            file.close()
+
+
+if __name__ == "__main__":
+    main()